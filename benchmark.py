@@ -1,12 +1,13 @@
 #!/usr/bin/env python3
 import os
-import json
-import subprocess
+import sys
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from pathlib import Path
-import tempfile
-import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import orjson
+
+from core.llm_client import LLMClient
+from core.file_scanner import FileScanner
 
 # Colors for terminal output
 class Colors:
@@ -19,43 +20,32 @@ class Colors:
     BOLD = '\033[1m'
     UNDERLINE = '\033[4m'
 
-def run_code_sheriff(package_path, temp_dir):
-    """Run code-sheriff on a package and parse the results"""
-    output_file = os.path.join(temp_dir, "result.json")
-    
+# Number of completed packages whose progress lines are written together
+PROGRESS_FLUSH_EVERY = 16
+
+# Scanner shared by all packages analyzed in a worker process
+_scanner = None
+
+def init_worker():
+    """Build the FileScanner once per worker process"""
+    global _scanner
+    # Without the response cache, so that repeated runs measure real analysis times
+    _scanner = FileScanner(llm_client=LLMClient(use_cache=False), show_progress=False)
+
+def run_code_sheriff(package_path):
+    """Run the scanner on a package and return the results"""
     try:
-        start_time = time.time()
-        subprocess.run(
-            ["code-sheriff", "project", package_path, "-r", "-o", output_file],
-            check=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            timeout=60  # 60 seconds timeout
-        )
-        execution_time = time.time() - start_time
-        
-        with open(output_file, "r") as f:
-            results = json.load(f)
-            
+        start_time = time.perf_counter()
+        results = _scanner.scan_directory(package_path, recursive=True)
+        execution_time = time.perf_counter() - start_time
         return results, execution_time
-    except subprocess.TimeoutExpired:
-        print(f"{Colors.YELLOW}Timeout analyzing {package_path} (exceeded 60 seconds){Colors.ENDC}")
-        return None, 60
-    except subprocess.CalledProcessError as e:
-        print(f"{Colors.RED}Error analyzing {package_path}: {e}{Colors.ENDC}")
-        print(f"stdout: {e.stdout.decode() if e.stdout else 'None'}")
-        print(f"stderr: {e.stderr.decode() if e.stderr else 'None'}")
-        return None, 0
-    except FileNotFoundError:
-        print(f"{Colors.RED}Error: code-sheriff command not found. Make sure it's installed.{Colors.ENDC}")
-        exit(1)
     except Exception as e:
         print(f"{Colors.RED}Unexpected error analyzing {package_path}: {e}{Colors.ENDC}")
         return None, 0
 
 def classify_package(results):
     """Classify a package as malicious, suspicious, or clean based on the scan results"""
-    if not results:
+    if not results or "error" in results:
         return "error"
     
     if results["summary"]["malicious_files"] > 0:
@@ -67,110 +57,126 @@ def classify_package(results):
 
 def benchmark():
     """Run the benchmark on all packages in the testcases directory"""
-    testcases_dir = Path("testcases")
-    if not testcases_dir.exists() or not testcases_dir.is_dir():
+    testcases_dir = "testcases"
+    if not os.path.isdir(testcases_dir):
         print(f"{Colors.RED}Error: testcases directory not found.{Colors.ENDC}")
         print("Make sure you've initialized the Git submodule:")
         print("  git submodule init")
         print("  git submodule update")
         return
     
-    # Get all directories in testcases (each is a package)
-    packages = [p for p in testcases_dir.iterdir() if p.is_dir() and not p.name.startswith('.')]
+    # Get all directories in testcases (each is a package); DirEntry.is_dir() avoids a stat per entry
+    with os.scandir(testcases_dir) as entries:
+        packages = [entry for entry in entries if entry.is_dir() and not entry.name.startswith('.')]
     print(f"{Colors.HEADER}Found {len(packages)} packages to analyze.{Colors.ENDC}")
     
-    # Create a temporary directory for results
-    with tempfile.TemporaryDirectory() as temp_dir:
-        # Create a thread pool for parallel processing
-        with ThreadPoolExecutor(max_workers=min(os.cpu_count()*2, 32)) as executor:
-            # Submit all packages for processing
-            future_to_package = {
-                executor.submit(run_code_sheriff, str(pkg), temp_dir): pkg
-                for pkg in packages
-            }
-            
-            # Statistics
-            results = {}
-            total_time = 0
-            errors = 0
-            timeouts = 0
-            completed = 0
-            
-            # Process results as they complete
-            print(f"{Colors.HEADER}Starting analysis...{Colors.ENDC}")
-            for future in as_completed(future_to_package):
-                package = future_to_package[future]
-                completed += 1
-                try:
-                    package_results, execution_time = future.result()
-                    package_classification = classify_package(package_results)
-                    
-                    if execution_time == 60 and package_results is None:
-                        status = f"{Colors.YELLOW}TIMEOUT{Colors.ENDC}"
-                        timeouts += 1
-                        package_classification = "timeout"
-                    elif package_classification == "malicious":
-                        status = f"{Colors.RED}MALICIOUS{Colors.ENDC}"
-                    elif package_classification == "suspicious":
-                        status = f"{Colors.YELLOW}SUSPICIOUS{Colors.ENDC}"
-                    elif package_classification == "clean":
-                        status = f"{Colors.GREEN}CLEAN{Colors.ENDC}"
-                    else:
-                        status = f"{Colors.RED}ERROR{Colors.ENDC}"
-                        errors += 1
-                    
-                    results[package.name] = {
-                        "classification": package_classification,
-                        "execution_time": execution_time,
-                        "details": package_results
-                    }
-                    
-                    total_time += execution_time
-                    
-                    print(f"[{completed}/{len(packages)}] {package.name}: {status} in {execution_time:.2f}s")
-                    
-                except Exception as e:
-                    print(f"[{completed}/{len(packages)}] {Colors.RED}Error processing {package.name}: {e}{Colors.ENDC}")
-                    errors += 1
-                    results[package.name] = {
-                        "classification": "error",
-                        "execution_time": 0,
-                        "details": None,
-                        "error": str(e)
-                    }
-            
-        # Calculate and print statistics
-        malicious_count = sum(1 for r in results.values() if r["classification"] == "malicious")
-        suspicious_count = sum(1 for r in results.values() if r["classification"] == "suspicious")
-        clean_count = sum(1 for r in results.values() if r["classification"] == "clean")
+    # Fail early on a missing API key instead of inside every worker
+    try:
+        LLMClient(use_cache=False)
+    except ValueError as e:
+        print(f"{Colors.RED}Error: {e}{Colors.ENDC}")
+        return
+    
+    # Create a process pool; each worker reuses a single scanner for all its packages.
+    # Per-package details are streamed to a JSON Lines file as they complete.
+    with ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=init_worker) as executor, \
+            open("benchmark_results.jsonl", "wb") as details_file:
+        # Submit all packages for processing
+        future_to_package = {
+            executor.submit(run_code_sheriff, pkg.path): pkg
+            for pkg in packages
+        }
         
-        print(f"\n{Colors.HEADER}{Colors.BOLD}Benchmark Results:{Colors.ENDC}")
-        print(f"{Colors.BOLD}Total packages:{Colors.ENDC} {len(packages)}")
-        print(f"{Colors.RED}{Colors.BOLD}Malicious packages:{Colors.ENDC} {malicious_count} ({malicious_count/len(packages)*100:.1f}%)")
-        print(f"{Colors.YELLOW}{Colors.BOLD}Suspicious packages:{Colors.ENDC} {suspicious_count} ({suspicious_count/len(packages)*100:.1f}%)")
-        print(f"{Colors.GREEN}{Colors.BOLD}Clean packages:{Colors.ENDC} {clean_count} ({clean_count/len(packages)*100:.1f}%)")
-        print(f"{Colors.YELLOW}{Colors.BOLD}Timeouts:{Colors.ENDC} {timeouts} ({timeouts/len(packages)*100:.1f}%)")
-        if errors > 0:
-            print(f"{Colors.RED}{Colors.BOLD}Errors:{Colors.ENDC} {errors} ({errors/len(packages)*100:.1f}%)")
-        print(f"{Colors.BOLD}Total analysis time:{Colors.ENDC} {total_time:.2f}s")
-        print(f"{Colors.BOLD}Average time per package:{Colors.ENDC} {total_time/len(packages):.2f}s")
+        # Statistics
+        results = {}
+        total_packages = len(packages)
+        total_time = 0
+        malicious_count = 0
+        suspicious_count = 0
+        clean_count = 0
+        errors = 0
+        progress_lines = []
         
-        # Save detailed results to a file
-        with open("benchmark_results.json", "w") as f:
-            json.dump({
-                "summary": {
-                    "total_packages": len(packages),
-                    "malicious_packages": malicious_count,
-                    "suspicious_packages": suspicious_count,
-                    "clean_packages": clean_count,
-                    "errors": errors,
-                    "total_time": total_time,
-                    "average_time_per_package": total_time/len(packages)
-                },
-                "package_results": results
-            }, f, indent=2)
+        # Process results as they complete
+        print(f"{Colors.HEADER}Starting analysis...{Colors.ENDC}")
+        for completed, future in enumerate(as_completed(future_to_package), 1):
+            package = future_to_package[future]
+            try:
+                package_results, execution_time = future.result()
+                package_classification = classify_package(package_results)
+                
+                if package_classification == "malicious":
+                    status = f"{Colors.RED}MALICIOUS{Colors.ENDC}"
+                    malicious_count += 1
+                elif package_classification == "suspicious":
+                    status = f"{Colors.YELLOW}SUSPICIOUS{Colors.ENDC}"
+                    suspicious_count += 1
+                elif package_classification == "clean":
+                    status = f"{Colors.GREEN}CLEAN{Colors.ENDC}"
+                    clean_count += 1
+                else:
+                    status = f"{Colors.RED}ERROR{Colors.ENDC}"
+                    errors += 1
+                
+                details_file.write(orjson.dumps({
+                    "package": package.name,
+                    "classification": package_classification,
+                    "execution_time": execution_time,
+                    "details": package_results
+                }) + b"\n")
+                results[package.name] = {
+                    "classification": package_classification,
+                    "execution_time": execution_time
+                }
+                
+                total_time += execution_time
+                
+                progress_lines.append(f"[{completed}/{total_packages}] {package.name}: {status} in {execution_time:.2f}s\n")
+                
+            except Exception as e:
+                progress_lines.append(f"[{completed}/{total_packages}] {Colors.RED}Error processing {package.name}: {e}{Colors.ENDC}\n")
+                errors += 1
+                results[package.name] = {
+                    "classification": "error",
+                    "execution_time": 0,
+                    "error": str(e)
+                }
+                details_file.write(orjson.dumps({"package": package.name, **results[package.name]}) + b"\n")
+            
+            # Write progress in batches rather than one print per package
+            if len(progress_lines) >= PROGRESS_FLUSH_EVERY or completed == total_packages:
+                sys.stdout.write("".join(progress_lines))
+                sys.stdout.flush()
+                progress_lines.clear()
         
-        print(f"\nDetailed results saved to {Colors.UNDERLINE}benchmark_results.json{Colors.ENDC}")
+    # Print statistics
+    print(f"\n{Colors.HEADER}{Colors.BOLD}Benchmark Results:{Colors.ENDC}")
+    print(f"{Colors.BOLD}Total packages:{Colors.ENDC} {total_packages}")
+    print(f"{Colors.RED}{Colors.BOLD}Malicious packages:{Colors.ENDC} {malicious_count} ({malicious_count/total_packages*100:.1f}%)")
+    print(f"{Colors.YELLOW}{Colors.BOLD}Suspicious packages:{Colors.ENDC} {suspicious_count} ({suspicious_count/total_packages*100:.1f}%)")
+    print(f"{Colors.GREEN}{Colors.BOLD}Clean packages:{Colors.ENDC} {clean_count} ({clean_count/total_packages*100:.1f}%)")
+    if errors > 0:
+        print(f"{Colors.RED}{Colors.BOLD}Errors:{Colors.ENDC} {errors} ({errors/total_packages*100:.1f}%)")
+    print(f"{Colors.BOLD}Total analysis time:{Colors.ENDC} {total_time:.2f}s")
+    print(f"{Colors.BOLD}Average time per package:{Colors.ENDC} {total_time/total_packages:.2f}s")
+    
+    # Save the summary to a file
+    with open("benchmark_results.json", "wb") as f:
+        f.write(orjson.dumps({
+            "summary": {
+                "total_packages": total_packages,
+                "malicious_packages": malicious_count,
+                "suspicious_packages": suspicious_count,
+                "clean_packages": clean_count,
+                "errors": errors,
+                "total_time": total_time,
+                "average_time_per_package": total_time/total_packages
+            },
+            "package_results": results
+        }, option=orjson.OPT_INDENT_2))
+    
+    print(f"\nSummary saved to {Colors.UNDERLINE}benchmark_results.json{Colors.ENDC}")
+    print(f"Detailed results saved to {Colors.UNDERLINE}benchmark_results.jsonl{Colors.ENDC}")
 
 if __name__ == "__main__":
     benchmark() 
\ No newline at end of file
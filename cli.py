@@ -1,18 +1,18 @@
 #!/usr/bin/env python3
 import os
 import sys
-import json
 import argparse
 import logging
 from typing import Dict, Any
 
-from core.llm_client import LLMClient
-from core.file_scanner import FileScanner
-from integrations.gitlab_integration import GitLabIntegration
+import orjson
+
 from utils import config
 
 def parse_args():
     """Parse command line arguments"""
+    cfg = config.get_config()
+    
     parser = argparse.ArgumentParser(
         description="CodeSheriff - Detect malicious code using LLM"
     )
@@ -32,7 +32,7 @@ def parse_args():
         "-c", "--concurrent-requests",
         type=int,
         default=None,
-        help=f"Maximum number of concurrent API requests (default: {config.MAX_CONCURRENT_REQUESTS})"
+        help=f"Maximum number of concurrent API requests (default: {cfg.MAX_CONCURRENT_REQUESTS})"
     )
     common_parser.add_argument(
         "-o", "--output", 
@@ -48,15 +48,26 @@ def parse_args():
         action="store_true",
         help="Enable debug mode with detailed logging"
     )
+    common_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Analyze every file even if identical code was analyzed before"
+    )
+    common_parser.add_argument(
+        "--prefilter",
+        action="store_true",
+        help="Report files as clean without calling the LLM when they are known-good or "
+             "Python code without calls or absolute imports (e.g. __init__.py re-exports)"
+    )
     common_parser.add_argument(
         "--provider",
         default=None,
-        help=f"LLM provider to use (default: {config.LLM_PROVIDER}). Options: openai, deepseek, anthropic, azure, custom, local, etc."
+        help=f"LLM provider to use (default: {cfg.LLM_PROVIDER}). Options: openai, deepseek, anthropic, azure, custom, local, etc."
     )
     common_parser.add_argument(
         "--model",
         default=None,
-        help=f"LLM model to use (default: {config.LLM_MODEL})"
+        help=f"LLM model to use (default: {cfg.LLM_MODEL})"
     )
     common_parser.add_argument(
         "--api-key",
@@ -77,6 +88,22 @@ def parse_args():
         action="store_true", 
         help="Scan subdirectories recursively"
     )
+    project_parser.add_argument(
+        "--whole-file",
+        action="store_true",
+        help="Analyze large files in several parts instead of only their beginning and end"
+    )
+    project_parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Submit files through the provider's Batch API (cheaper, results within 24 hours)"
+    )
+    project_parser.add_argument(
+        "--checkpoint",
+        metavar="FILE",
+        help="Append each result to this JSONL file and skip files already recorded in it "
+             "with unchanged content, to resume an interrupted scan (directories only, not with --batch)"
+    )
     
     # GitLab mode parser
     gitlab_parser = subparsers.add_parser("gitlab", help="Scan a GitLab merge request", parents=[common_parser])
@@ -88,28 +115,34 @@ def parse_args():
 
 def write_output(results: Dict[str, Any], output_path: str = None):
     """Write results to output file or stdout"""
-    output_json = json.dumps(results, indent=2, ensure_ascii=False)
+    output_json = orjson.dumps(results, option=orjson.OPT_INDENT_2)
     
     if output_path:
-        with open(output_path, "w", encoding="utf-8") as f:
+        with open(output_path, "wb") as f:
             f.write(output_json)
         print(f"Results written to {output_path}")
     else:
-        print(output_json)
+        print(output_json.decode("utf-8"))
 
 def setup_logging(debug=False, verbose=False):
     """设置日志级别"""
+    # 安装日志处理器（扫描模块延迟导入，不能依赖它们的配置）
+    logging.basicConfig(level=logging.WARNING,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     # 默认设置为WARNING级别
     logging.getLogger().setLevel(logging.WARNING)
     logging.getLogger("httpx").setLevel(logging.WARNING)
-    logging.getLogger("LiteLLM").setLevel(logging.WARNING)
     
     if debug:
         logging.getLogger("CodeSheriff").setLevel(logging.DEBUG)
-        # 开启LiteLLM的调试模式
+        # 开启LiteLLM的调试模式（非调试模式下由LLMClient在导入litellm时配置）
         import litellm
         litellm.set_verbose = True
-        litellm._turn_on_debug()
+        try:
+            litellm._turn_on_debug()
+        except AttributeError:
+            # 私有API，旧版本的litellm中不存在
+            logging.getLogger("LiteLLM").setLevel(logging.DEBUG)
     elif verbose:
         logging.getLogger("CodeSheriff").setLevel(logging.INFO)
     else:
@@ -124,12 +157,25 @@ def main():
     
     logger = logging.getLogger("CodeSheriff")
     
+    # Checkpoints are only written by online scans of directories
+    if args.mode == "project" and args.checkpoint:
+        if args.batch:
+            logger.error("Error: --checkpoint cannot be used with --batch")
+            print("Error: --checkpoint cannot be used with --batch")
+            sys.exit(1)
+        if os.path.isfile(args.path):
+            logger.error("Error: --checkpoint can only be used when scanning a directory")
+            print("Error: --checkpoint can only be used when scanning a directory")
+            sys.exit(1)
+    
+    cfg = config.get_config()
+    
     # Check if API key is set
-    api_key = args.api_key or config.LLM_API_KEY
-    provider = args.provider or config.LLM_PROVIDER
+    api_key = args.api_key or cfg.LLM_API_KEY
+    provider = args.provider or cfg.LLM_PROVIDER
     
-    if not api_key and provider not in ['local', 'custom']:
-        logger.error(f"Error: API key for {provider} is not set")
+    if not api_key and provider not in ['local', 'custom'] and not cfg.LLM_ENDPOINTS:
+        logger.error("Error: API key for %s is not set", provider)
         print(f"Error: API key for {provider} is not set")
         print(f"Please set it using: export LLM_API_KEY=your_api_key or {provider.upper()}_API_KEY=your_api_key")
         print("Or provide it using the --api-key option")
@@ -137,58 +183,107 @@ def main():
     
     # Override the MAX_CONCURRENT_REQUESTS if specified
     if args.concurrent_requests is not None:
-        config.MAX_CONCURRENT_REQUESTS = args.concurrent_requests
+        cfg.MAX_CONCURRENT_REQUESTS = args.concurrent_requests
+    
+    if args.prefilter:
+        cfg.PREFILTER = True
     
     # Determine the number of worker threads
-    max_workers = args.workers or min(32, os.cpu_count() + 4)
+    max_workers = args.workers or cfg.DEFAULT_WORKERS
     
     # Print configuration if verbose
     if args.verbose or args.debug:
-        logger.info(f"Configuration:")
-        logger.info(f"  - Provider: {args.provider or config.LLM_PROVIDER}")
-        logger.info(f"  - Model: {args.model or config.LLM_MODEL}")
-        logger.info(f"  - API URL: {args.api_url or config.LLM_API_URL}")
-        logger.info(f"  - Worker threads: {max_workers}")
-        logger.info(f"  - Concurrent API requests: {config.MAX_CONCURRENT_REQUESTS}")
-        logger.info(f"  - Malicious threshold: {config.MALICIOUS_THRESHOLD}")
-        logger.info(f"  - Max file size: {config.MAX_FILE_SIZE} bytes")
-        logger.info(f"  - Supported extensions: {', '.join(config.SUPPORTED_EXTENSIONS)}")
-        logger.info(f"  - Debug mode: {args.debug}")
+        logger.info("Configuration:")
+        logger.info("  - Provider: %s", provider)
+        logger.info("  - Model: %s", args.model or cfg.LLM_MODEL)
+        logger.info("  - API URL: %s", args.api_url or cfg.LLM_API_URL)
+        if cfg.LLM_ENDPOINTS:
+            logger.info("  - Endpoints: %s", cfg.LLM_ENDPOINTS)
+        logger.info("  - Worker threads: %s", max_workers)
+        logger.info("  - Concurrent API requests: %s", cfg.MAX_CONCURRENT_REQUESTS)
+        logger.info("  - API retries: %s", cfg.LLM_MAX_RETRIES)
+        logger.info("  - Rate limit: %s requests/s, %s tokens/min (0 = no limit)", cfg.LLM_REQUESTS_PER_SECOND, cfg.LLM_TOKENS_PER_MINUTE)
+        logger.info("  - Malicious threshold: %s", cfg.MALICIOUS_THRESHOLD)
+        logger.info("  - Max file size: %s bytes", cfg.MAX_FILE_SIZE)
+        logger.info("  - Max prompt size: %s bytes", cfg.MAX_PROMPT_BYTES)
+        logger.info("  - Supported extensions: %s", cfg.SUPPORTED_EXTENSIONS_STR)
+        logger.info("  - Prefilter: %s", cfg.PREFILTER)
+        logger.info("  - Response cache: %s", cfg.CACHE_DIR if cfg.CACHE_DIR and not args.no_cache else "disabled")
+        logger.info("  - Debug mode: %s", args.debug)
+    
+    # Scanner modules (and litellm behind them) are imported only once they are needed,
+    # so that --help and argument errors return quickly
+    from core.llm_client import LLMClient, LLMClientPool, BATCH_PROVIDERS
     
     # Initialize LLM client
-    llm_client = LLMClient(
+    client_args = dict(
         api_key=args.api_key,
         api_url=args.api_url,
         model=args.model,
         provider=args.provider,
-        verbose=args.verbose or args.debug
+        verbose=args.verbose or args.debug,
+        use_cache=not args.no_cache
     )
+    if cfg.LLM_ENDPOINTS:
+        # Spread requests over several endpoints
+        try:
+            endpoints = orjson.loads(cfg.LLM_ENDPOINTS)
+        except orjson.JSONDecodeError as e:
+            logger.error("Error: invalid LLM_ENDPOINTS: %s", e)
+            print(f"Error: LLM_ENDPOINTS is not valid JSON: {e}")
+            sys.exit(1)
+        try:
+            llm_client = LLMClientPool.from_endpoints(endpoints, **client_args)
+        except ValueError as e:
+            logger.error("Error: invalid LLM_ENDPOINTS: %s", e)
+            print(f"Error: invalid LLM_ENDPOINTS: {e}")
+            sys.exit(1)
+    else:
+        llm_client = LLMClient(**client_args)
     
     if args.mode == "project":
         # Project mode
-        scanner = FileScanner(llm_client=llm_client, max_workers=max_workers)
+        from core.file_scanner import FileScanner
+        
+        scanner = FileScanner(llm_client=llm_client, max_workers=max_workers, scan_whole_file=args.whole_file)
+        
+        if args.batch and llm_client.provider not in BATCH_PROVIDERS:
+            logger.error("Error: batch mode is not supported for provider %s", llm_client.provider)
+            print(f"Error: batch mode is not supported for provider {llm_client.provider}")
+            print(f"Supported providers: {', '.join(BATCH_PROVIDERS)}")
+            sys.exit(1)
         
         if os.path.isfile(args.path):
             # Scan a single file
             if args.verbose or args.debug:
-                logger.info(f"Scanning file: {args.path}")
+                logger.info("Scanning file: %s", args.path)
             results = scanner.scan_file(args.path)
         else:
             # Scan a directory
             if args.verbose or args.debug:
-                logger.info(f"Scanning directory: {args.path} (recursive: {args.recursive})")
-            results = scanner.scan_directory(args.path, recursive=args.recursive)
+                logger.info("Scanning directory: %s (recursive: %s)", args.path, args.recursive)
+            try:
+                results = scanner.scan_directory(args.path, recursive=args.recursive,
+                                                 mode="batch" if args.batch else "online",
+                                                 checkpoint_path=args.checkpoint)
+            except RuntimeError as e:
+                # A batch that failed, expired or was cancelled
+                logger.error("Error: %s", e)
+                print(f"Error: {e}")
+                sys.exit(1)
         
         write_output(results, args.output)
     
     elif args.mode == "gitlab":
         # GitLab mode
+        from integrations.gitlab_integration import GitLabIntegration
+        
         gitlab = GitLabIntegration(llm_client=llm_client, max_workers=max_workers)
         if args.verbose or args.debug:
-            logger.info(f"Scanning merge request:")
-            logger.info(f"  - Project directory: {args.project_dir}")
-            logger.info(f"  - Source branch: {args.source_branch}")
-            logger.info(f"  - Target branch: {args.target_branch}")
+            logger.info("Scanning merge request:")
+            logger.info("  - Project directory: %s", args.project_dir)
+            logger.info("  - Source branch: %s", args.source_branch)
+            logger.info("  - Target branch: %s", args.target_branch)
         results = gitlab.scan_merge_request(
             args.project_dir, 
             args.source_branch, 
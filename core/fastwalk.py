@@ -0,0 +1,178 @@
+import os
+import stat
+import ctypes
+import struct
+import platform
+import threading
+from typing import List, Tuple, Optional, AbstractSet
+
+# getdents64 system call number per architecture
+_SYS_GETDENTS64 = {
+    "x86_64": 217,
+    "amd64": 217,
+    "aarch64": 61,
+    "arm64": 61,
+}
+
+# Directory entry types reported by getdents64
+DT_UNKNOWN = 0
+DT_DIR = 4
+DT_REG = 8
+DT_LNK = 10
+
+# Size of the buffer each getdents64 call fills; much larger than the 32 KB used by libc's readdir
+_BUFFER_SIZE = 1 << 20
+
+# Offset of d_reclen in struct linux_dirent64, after the 64-bit d_ino and d_off
+_RECLEN_OFFSET = 16
+
+# Offset of d_name, after d_reclen (16 bits) and d_type (8 bits)
+_NAME_OFFSET = 19
+
+_reclen_type = struct.Struct("=HB")
+
+def _load_getdents64() -> Optional[ctypes._CFuncPtr]:
+    """Get the libc syscall function if getdents64 can be called on this platform"""
+    if os.name != "posix" or platform.system() != "Linux" or platform.machine().lower() not in _SYS_GETDENTS64:
+        return None
+    try:
+        syscall = ctypes.CDLL(None, use_errno=True).syscall
+    except (OSError, AttributeError):
+        return None
+    syscall.restype = ctypes.c_long
+    syscall.argtypes = [ctypes.c_long, ctypes.c_int, ctypes.c_void_p, ctypes.c_size_t]
+    return syscall
+
+_syscall = _load_getdents64()
+_SYS_NR = _SYS_GETDENTS64.get(platform.machine().lower())
+
+# One buffer per walking thread
+_buffers = threading.local()
+
+# Whether getdents64 can be used on this platform
+GETDENTS_AVAILABLE = _syscall is not None
+
+def list_directory(directory_path: str, max_size: int, extensions: AbstractSet[str],
+                   use_getdents: bool = False) -> Tuple[List[str], List[str]]:
+    """
+    List the files to scan and the subdirectories of a directory
+    
+    With use_getdents on Linux, entries are read with getdents64 into a 1 MB buffer,
+    which needs far fewer system calls than os.scandir on directories with very
+    many entries. Entries are then parsed in Python, so this only pays off where
+    system calls are expensive (e.g. network or FUSE file systems); os.scandir is
+    used otherwise.
+    
+    Args:
+        directory_path: Path to the directory
+        max_size: Size in bytes above which files are skipped
+        extensions: Supported extensions, lowercased and with the leading dot;
+            matched against the file name from its last dot
+        use_getdents: Whether to read directories with getdents64 where available
+    
+    Returns:
+        Tuple of (paths of files to scan, paths of subdirectories)
+    """
+    if use_getdents and GETDENTS_AVAILABLE:
+        try:
+            return _list_with_getdents(directory_path, max_size, extensions)
+        except OSError:
+            # Unreadable directories are skipped, as os.walk does
+            return [], []
+    return _list_with_scandir(directory_path, max_size, extensions)
+
+def _read_entries(directory_path: str) -> List[Tuple[bytes, int]]:
+    """
+    Read the names and types of the entries of a directory with getdents64
+    
+    Args:
+        directory_path: Path to the directory
+    
+    Returns:
+        List of (encoded name, d_type) tuples, without "." and ".."
+    """
+    buffer = getattr(_buffers, "buffer", None)
+    if buffer is None:
+        buffer = _buffers.buffer = ctypes.create_string_buffer(_BUFFER_SIZE)
+    
+    entries = []
+    fd = os.open(directory_path, os.O_RDONLY | os.O_DIRECTORY | os.O_CLOEXEC)
+    try:
+        while True:
+            size = _syscall(_SYS_NR, fd, buffer, _BUFFER_SIZE)
+            if size < 0:
+                errno = ctypes.get_errno()
+                raise OSError(errno, os.strerror(errno), directory_path)
+            if size == 0:
+                return entries
+            
+            data = ctypes.string_at(buffer, size)
+            find = data.index
+            unpack_from = _reclen_type.unpack_from
+            append = entries.append
+            offset = 0
+            while offset < size:
+                reclen, d_type = unpack_from(data, offset + _RECLEN_OFFSET)
+                start = offset + _NAME_OFFSET
+                name = data[start:find(b"\0", start)]
+                offset += reclen
+                if name != b"." and name != b"..":
+                    append((name, d_type))
+    finally:
+        os.close(fd)
+
+def _list_with_getdents(directory_path: str, max_size: int, extensions: AbstractSet[str]) -> Tuple[List[str], List[str]]:
+    """List a directory with getdents64, only calling stat for files with a supported extension"""
+    file_paths = []
+    subdirectories = []
+    prefix = os.path.join(directory_path, "")
+    
+    for name, d_type in _read_entries(directory_path):
+        name = os.fsdecode(name)
+        path = prefix + name
+        try:
+            if d_type == DT_UNKNOWN:
+                # Some file systems do not report entry types
+                mode = os.lstat(path).st_mode
+                d_type = DT_DIR if stat.S_ISDIR(mode) else DT_LNK if stat.S_ISLNK(mode) else DT_REG
+            
+            if d_type == DT_DIR:
+                subdirectories.append(path)
+            elif d_type == DT_REG or d_type == DT_LNK:
+                dot = name.rfind(".")
+                
+                # Skip files that are too large or have unsupported extensions; symlinks are followed
+                if dot > 0 and name[dot:].lower() in extensions and name[:dot].strip("."):
+                    st = os.stat(path)
+                    if stat.S_ISREG(st.st_mode) and st.st_size <= max_size:
+                        file_paths.append(path)
+        except OSError:
+            continue
+    
+    return file_paths, subdirectories
+
+def _list_with_scandir(directory_path: str, max_size: int, extensions: AbstractSet[str]) -> Tuple[List[str], List[str]]:
+    """List a directory with os.scandir, reusing the file type and stat results of each entry"""
+    file_paths = []
+    subdirectories = []
+    try:
+        with os.scandir(directory_path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirectories.append(entry.path)
+                    elif entry.is_file():
+                        name = entry.name
+                        dot = name.rfind(".")
+                        
+                        # Skip files that are too large or have unsupported extensions
+                        if (dot > 0 and name[dot:].lower() in extensions and name[:dot].strip(".") and
+                                entry.stat().st_size <= max_size):
+                            file_paths.append(entry.path)
+                except OSError:
+                    continue
+    except OSError:
+        # Unreadable directories are skipped, as os.walk does
+        pass
+    
+    return file_paths, subdirectories
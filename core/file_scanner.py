@@ -1,34 +1,121 @@
 import os
 import sys
-from typing import List, Dict, Any, Generator, Tuple
+import mmap
+import stat
+import queue
+import asyncio
+import heapq
+import hashlib
+import threading
+from typing import List, Dict, Any, Generator, Optional, Iterator
 from pathlib import Path
 from tqdm import tqdm
 import concurrent.futures
-from threading import Lock
+from contextlib import contextmanager
+
+import orjson
 
 from utils import config
-from core.llm_client import LLMClient
+from utils.hashing import content_hash
+from core.llm_client import LLMClient, run_coroutine
+from core.prefilter import Prefilter
+from core.fastwalk import list_directory
+
+# Number of threads listing directories in parallel
+WALK_WORKERS = 8
+
+# Maximum number of found files waiting to be scanned before the walk pauses
+WALK_QUEUE_SIZE = 1024
+
+# Files read and waiting for analysis per API request slot; bounds the file contents held in memory
+SCANS_PER_REQUEST_SLOT = 2
+
+# Keys every analysis read back from a checkpoint must have
+_ANALYSIS_KEYS = frozenset({"is_malicious", "malicious_probability", "reasoning"})
+
+# Marks the end of the directory walk in the queue of found files
+_WALK_DONE = object()
+
+# Inserted where the middle of a file too large for one prompt was left out
+_ELISION_MARKER = "\n\n... [{} bytes omitted] ...\n\n"
+
+@contextmanager
+def _map_file(file_path: str) -> Iterator[memoryview]:
+    """
+    Map a file into memory for reading, so its content is decoded or hashed
+    without first being copied into a bytes object
+    
+    Args:
+        file_path: Path to the file
+        
+    Yields:
+        Read-only view of the file content (empty for an empty file, which cannot be mapped)
+    """
+    with open(file_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield memoryview(b"")
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+            yield view
+
+def _char_start(content: memoryview, offset: int) -> int:
+    """
+    Move a byte offset back to the start of the UTF-8 character it falls in,
+    so that cutting the content there does not split a multi-byte character
+    
+    Args:
+        content: UTF-8 encoded content
+        offset: Byte offset into the content
+        
+    Returns:
+        The offset of the first byte of the character (at most 3 bytes earlier)
+    """
+    for _ in range(3):
+        # Continuation bytes look like 0b10xxxxxx
+        if offset <= 0 or offset >= len(content) or content[offset] & 0xC0 != 0x80:
+            break
+        offset -= 1
+    return offset
 
 class FileScanner:
-    def __init__(self, llm_client: LLMClient = None, max_workers: int = None):
+    def __init__(self, llm_client: LLMClient = None, max_workers: int = None, show_progress: bool = True,
+                 scan_whole_file: bool = False, prefilter: Optional[bool] = None):
         """
         Initialize the file scanner
         
         Args:
             llm_client: LLM client instance (creates one if not provided)
-            max_workers: Maximum number of worker threads (defaults to number of processors)
+            max_workers: Maximum number of worker threads used for reading files (defaults to number of processors)
+            show_progress: Whether to display a progress bar while scanning directories
+            scan_whole_file: Whether to analyze files larger than MAX_PROMPT_BYTES in several parts
+                instead of only their beginning and end
+            prefilter: Whether to classify trivially clean files without calling the LLM
+                (defaults to config)
         """
         self.llm_client = llm_client or LLMClient()
-        self.max_workers = max_workers or min(32, os.cpu_count() + 4)
-        self.progress_lock = Lock()
+        self.max_workers = max_workers or config.get_config().DEFAULT_WORKERS
+        self.show_progress = show_progress
+        self.scan_whole_file = scan_whole_file
+        if prefilter is None:
+            prefilter = config.get_config().PREFILTER
+        self.prefilter = Prefilter() if prefilter else None
+        # File reads run on these threads so they don't block the event loop
+        self.io_executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers,
+                                                                 thread_name_prefix="CodeSheriff-io")
         
-    def scan_directory(self, directory_path: str, recursive: bool = True) -> Dict[str, Any]:
+    def scan_directory(self, directory_path: str, recursive: bool = True, mode: str = "online",
+                       checkpoint_path: Optional[str] = None) -> Dict[str, Any]:
         """
         Scan a directory for malicious code
         
         Args:
             directory_path: Path to the directory to scan
             recursive: Whether to scan subdirectories recursively
+            mode: "online" to analyze files with concurrent API requests, or "batch" to
+                submit them through the provider's Batch API and wait for the results
+            checkpoint_path: JSONL file each result is appended to as soon as it is
+                known (online mode only); files it already holds a result for, with
+                unchanged content, are not scanned again, so an interrupted scan resumes
             
         Returns:
             Dict with scan results
@@ -41,39 +128,244 @@ class FileScanner:
         if not os.path.isdir(directory_path):
             return {"error": f"Not a directory: {directory_path}"}
         
-        # Get all files to scan
-        files_to_scan = list(self._get_files_to_scan(directory_path, recursive))
+        if mode == "batch":
+            # Get all files to scan
+            files_to_scan = list(self._get_files_to_scan(directory_path, recursive))
+            if not files_to_scan:
+                return {"error": "No supported files found to scan"}
+            return self._aggregate_results(self.scan_files_batch(files_to_scan))
         
-        if not files_to_scan:
-            return {"error": "No supported files found to scan"}
+        # Scan files concurrently as the walk finds them
+        results = run_coroutine(self._scan_files(self._get_file_batches_to_scan(directory_path, recursive),
+                                                 directory_path, checkpoint_path=checkpoint_path))
         
-        # Scan files in parallel
-        results = []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            # Create a shared progress bar
-            progress = tqdm(total=len(files_to_scan), desc="Scanning files", file=sys.stdout)
-            
-            # Submit all scan tasks
-            future_to_file = {executor.submit(self._scan_file_with_progress, file_path, progress): file_path 
-                             for file_path in files_to_scan}
-            
-            # Process results as they complete
-            for future in concurrent.futures.as_completed(future_to_file):
-                result = future.result()
-                results.append(result)
-                
-            progress.close()
+        if not results:
+            return {"error": "No supported files found to scan"}
         
         # Aggregate results
         return self._aggregate_results(results)
     
-    def _scan_file_with_progress(self, file_path: str, progress: tqdm) -> Dict[str, Any]:
-        """Scan a file and update the progress bar"""
-        result = self.scan_file(file_path)
-        with self.progress_lock:
-            progress.update(1)
+    def scan_files(self, file_paths: List[str], submitter: Optional[str] = None,
+                   file_sizes: Optional[Dict[str, int]] = None) -> List[Dict[str, Any]]:
+        """
+        Scan several files for malicious code concurrently
+        
+        Args:
+            file_paths: Paths of the files to scan
+            submitter: Identifier of this scan, used to share API requests fairly
+                with other scans running in the same process
+            file_sizes: Sizes of files the caller has already checked to be
+                regular files, keyed by path; those files are not stat'ed again
+            
+        Returns:
+            List of scan results, one per file
+        """
+        return run_coroutine(self._scan_files(iter([file_paths]), submitter, file_sizes))
+    
+    def scan_files_batch(self, file_paths: List[str]) -> List[Dict[str, Any]]:
+        """
+        Scan several files for malicious code through the provider's Batch API
+        
+        Args:
+            file_paths: Paths of the files to scan
+            
+        Returns:
+            List of scan results, one per file
+        """
+        results = []
+        prompts = {}
+        id_to_file = {}
+        
+        for file_path in file_paths:
+            file_path = os.path.abspath(file_path)
+            try:
+                code = self._read_code(file_path)
+            except Exception as e:
+                results.append({
+                    "file_path": file_path,
+                    "error": str(e)
+                })
+                continue
+            
+            cached = self.llm_client.get_cached_analysis(code)
+            if cached is not None:
+                results.append({
+                    "file_path": file_path,
+                    "analysis": cached
+                })
+                continue
+            
+            custom_id = hashlib.sha1(file_path.encode("utf-8")).hexdigest()
+            prompts[custom_id] = self.llm_client._create_malicious_code_prompt(code, file_path)
+            id_to_file[custom_id] = (file_path, code)
+        
+        if not prompts:
+            return results
+        
+        batch_id = self.llm_client.submit_batch(prompts)
+        analyses = self.llm_client.wait_for_batch(batch_id)
+        
+        for custom_id, (file_path, code) in id_to_file.items():
+            analysis = analyses.get(custom_id) or self.llm_client._error_analysis("No result returned for this file in the batch")
+            self.llm_client.cache_analysis(code, analysis)
+            results.append({
+                "file_path": file_path,
+                "analysis": analysis
+            })
+        
+        return results
+    
+    async def _scan_files(self, file_batches: Iterator[List[str]], submitter: Optional[str],
+                          file_sizes: Optional[Dict[str, int]] = None,
+                          checkpoint_path: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Scan files on the event loop, updating a shared progress bar
+        
+        Args:
+            file_batches: Iterator over batches of file paths; it may block while
+                more files are found, so it is advanced on the I/O threads
+            submitter: Identifier of the scan the files belong to
+            file_sizes: Known sizes of already checked files, keyed by path
+            checkpoint_path: JSONL file to resume from and append results to
+            
+        Returns:
+            List of scan results, one per file
+        """
+        loop = asyncio.get_running_loop()
+        progress = tqdm(total=0, desc="Scanning files", file=sys.stdout,
+                        disable=not self.show_progress)
+        
+        checkpoint = None
+        if checkpoint_path:
+            done = await loop.run_in_executor(self.io_executor, self._load_checkpoint, checkpoint_path)
+            # Unbuffered, so every result line reaches the file as soon as it is written
+            checkpoint = open(checkpoint_path, "ab", buffering=0)
+        
+        # Files are only read once they are about to be analyzed, so limit the files
+        # in progress to a few per request slot instead of starting all of them at once
+        pending = asyncio.Semaphore(SCANS_PER_REQUEST_SLOT * self.llm_client.max_concurrent_requests)
+        
+        async def scan_with_progress(file_path: str) -> Dict[str, Any]:
+            try:
+                file_size = file_sizes.get(file_path) if file_sizes else None
+                if checkpoint is None:
+                    result = await self.scan_file_async(file_path, submitter, file_size)
+                else:
+                    result = await self._scan_file_resumable(file_path, submitter, file_size, done, checkpoint)
+                progress.update(1)
+                return result
+            finally:
+                pending.release()
+        
+        tasks = []
+        try:
+            # Start scanning each batch of files as it arrives, waiting while enough files are
+            # in progress; the walk pauses in turn once its queue of found files is full
+            while True:
+                file_paths = await loop.run_in_executor(self.io_executor, next, file_batches, None)
+                if file_paths is None:
+                    break
+                progress.total += len(file_paths)
+                progress.refresh()
+                for file_path in file_paths:
+                    await pending.acquire()
+                    tasks.append(asyncio.ensure_future(scan_with_progress(file_path)))
+            
+            return await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            if hasattr(file_batches, "close"):
+                file_batches.close()
+            if checkpoint is not None:
+                checkpoint.close()
+            progress.close()
+    
+    async def _scan_file_resumable(self, file_path: str, submitter: Optional[str], file_size: Optional[int],
+                                   done: Dict[str, Dict[str, Any]], checkpoint: Any) -> Dict[str, Any]:
+        """
+        Scan a file unless the checkpoint holds a result for its current content
+        
+        Args:
+            file_path: Path to the file to scan
+            submitter: Identifier of the scan the file belongs to
+            file_size: Size of the file, if already known
+            done: Results loaded from the checkpoint, keyed by file path
+            checkpoint: Binary file new results are appended to
+            
+        Returns:
+            Dict with scan results for the file, including the hash of its content
+        """
+        file_path = os.path.abspath(file_path)
+        try:
+            digest = await asyncio.get_running_loop().run_in_executor(self.io_executor, self._hash_file, file_path)
+        except OSError:
+            # Let the regular checks report the problem
+            return await self.scan_file_async(file_path, submitter, file_size)
+        
+        previous = done.get(file_path)
+        if previous is not None and previous.get("content_hash") == digest and not self._is_failed(previous):
+            return previous
+        
+        result = await self.scan_file_async(file_path, submitter, file_size)
+        result["content_hash"] = digest
+        # Failed results are not recorded, so a resumed scan tries these files again
+        if not self._is_failed(result):
+            checkpoint.write(orjson.dumps(result) + b"\n")
         return result
     
+    @staticmethod
+    def _is_failed(result: Dict[str, Any]) -> bool:
+        """Whether a scan result records a failure, of the scan itself or of the LLM analysis"""
+        return "error" in result or bool(result.get("analysis", {}).get("error"))
+    
+    @staticmethod
+    def _load_checkpoint(checkpoint_path: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Load the successful results recorded in a checkpoint file
+        
+        Results without a complete analysis are ignored, so those files are scanned
+        again. A last line cut short when the previous scan was interrupted is skipped
+        and terminated, so that new results start on a line of their own.
+        
+        Args:
+            checkpoint_path: JSONL file written by a previous scan
+            
+        Returns:
+            Latest successful result of each file, keyed by file path
+        """
+        done = {}
+        line = b"\n"
+        try:
+            with open(checkpoint_path, "rb") as f:
+                for line in f:
+                    try:
+                        result = orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        continue
+                    if not isinstance(result, dict) or not isinstance(result.get("file_path"), str):
+                        continue
+                    # Only complete, successful analyses count as done
+                    analysis = result.get("analysis")
+                    if (isinstance(analysis, dict) and _ANALYSIS_KEYS.issubset(analysis)
+                            and not FileScanner._is_failed(result)):
+                        done[result["file_path"]] = result
+                    else:
+                        done.pop(result["file_path"], None)
+        except FileNotFoundError:
+            return done
+        
+        if not line.endswith(b"\n"):
+            with open(checkpoint_path, "ab") as f:
+                f.write(b"\n")
+        return done
+    
+    @staticmethod
+    def _hash_file(file_path: str) -> str:
+        """Hash the content of a file"""
+        with _map_file(file_path) as content:
+            return content_hash(content)
+    
     def scan_file(self, file_path: str) -> Dict[str, Any]:
         """
         Scan a single file for malicious code
@@ -84,42 +376,79 @@ class FileScanner:
         Returns:
             Dict with scan results for the file
         """
-        file_path = os.path.abspath(file_path)
+        return run_coroutine(self.scan_file_async(file_path))
+    
+    async def scan_file_async(self, file_path: str, submitter: Optional[str] = None,
+                              file_size: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Scan a single file for malicious code from within an event loop
         
-        if not os.path.exists(file_path):
-            return {
-                "file_path": file_path,
-                "error": "File not found"
-            }
+        Args:
+            file_path: Path to the file to scan
+            submitter: Identifier of the scan the file belongs to
+            file_size: Size of the file if the caller has already checked that it
+                is a regular file, which saves another stat call
+            
+        Returns:
+            Dict with scan results for the file
+        """
+        file_path = os.path.abspath(file_path)
+        cfg = config.get_config()
         
-        if not os.path.isfile(file_path):
-            return {
-                "file_path": file_path,
-                "error": "Not a file"
-            }
+        if file_size is None:
+            # One stat call answers existence, type and size
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                return {
+                    "file_path": file_path,
+                    "error": "File not found"
+                }
+            
+            if not stat.S_ISREG(st.st_mode):
+                return {
+                    "file_path": file_path,
+                    "error": "Not a file"
+                }
+            file_size = st.st_size
         
         # Check file size
-        if os.path.getsize(file_path) > config.MAX_FILE_SIZE:
+        if file_size > cfg.MAX_FILE_SIZE:
             return {
                 "file_path": file_path,
-                "error": f"File too large (max size: {config.MAX_FILE_SIZE} bytes)"
+                "error": f"File too large (max size: {cfg.MAX_FILE_SIZE} bytes)"
             }
         
         # Check file extension
-        _, ext = os.path.splitext(file_path)
-        if ext not in config.SUPPORTED_EXTENSIONS:
+        ext = os.path.splitext(file_path)[1]
+        if ext.lower() not in cfg.SUPPORTED_EXTENSIONS:
             return {
                 "file_path": file_path,
                 "error": f"Unsupported file extension: {ext}"
             }
         
         try:
-            # Read file content
-            with open(file_path, "r", encoding="utf-8") as f:
-                code = f.read()
+            loop = asyncio.get_running_loop()
             
-            # Analyze the code
-            analysis = self.llm_client.analyze_code(code, file_path)
+            # Skip the LLM for files that are clean by cheap checks
+            if self.prefilter is not None:
+                analysis = await loop.run_in_executor(self.io_executor, self.prefilter.check_file, file_path)
+                if analysis is not None:
+                    return {
+                        "file_path": file_path,
+                        "analysis": analysis
+                    }
+            
+            if self.scan_whole_file:
+                # Analyze every part of the file and combine the verdicts
+                chunks = await loop.run_in_executor(self.io_executor, self._read_chunks, file_path)
+                analysis = await self._analyze_chunks(chunks, file_path, submitter)
+            else:
+                # Read file content, trimmed to the prompt budget
+                code = await loop.run_in_executor(self.io_executor, self._read_code, file_path)
+                
+                # Analyze the code
+                analysis = await self.llm_client.analyze_code(code, file_path, submitter)
             
             # Return the result
             return {
@@ -132,6 +461,97 @@ class FileScanner:
                 "error": str(e)
             }
     
+    async def _analyze_chunks(self, chunks: List[str], file_path: str, submitter: Optional[str]) -> Dict[str, Any]:
+        """
+        Analyze the parts of a file and merge the results
+        
+        Args:
+            chunks: Consecutive parts of the file content
+            file_path: Path to the file
+            submitter: Identifier of the scan the file belongs to
+            
+        Returns:
+            Merged analysis results: malicious if any part is, with the highest
+            probability and the threats found in all parts
+        """
+        if len(chunks) == 1:
+            return await self.llm_client.analyze_code(chunks[0], file_path, submitter)
+        
+        analyses = await asyncio.gather(*(
+            self.llm_client.analyze_code(chunk, f"{file_path} (part {i}/{len(chunks)})", submitter)
+            for i, chunk in enumerate(chunks, 1)
+        ))
+        
+        for analysis in analyses:
+            if analysis.get("error"):
+                return analysis
+        
+        return {
+            "is_malicious": any(analysis["is_malicious"] for analysis in analyses),
+            "malicious_probability": max(analysis["malicious_probability"] for analysis in analyses),
+            "reasoning": "\n".join(f"[Part {i}/{len(analyses)}] {analysis['reasoning']}"
+                                   for i, analysis in enumerate(analyses, 1)),
+            "identified_threats": list(dict.fromkeys(
+                threat for analysis in analyses for threat in analysis.get("identified_threats", [])
+            ))
+        }
+    
+    @staticmethod
+    def _read_code(file_path: str) -> str:
+        """
+        Read the content of a source file for analysis
+        
+        Files larger than MAX_PROMPT_BYTES are reduced to their beginning and end,
+        which bounds the prompt size regardless of the file size. The cuts are
+        made on character boundaries.
+        
+        Args:
+            file_path: Path to the file
+            
+        Returns:
+            The (possibly trimmed) file content
+        """
+        limit = config.get_config().MAX_PROMPT_BYTES
+        with _map_file(file_path) as content:
+            size = len(content)
+            if not limit or size <= limit:
+                return str(content, "utf-8", "replace")
+            head_end = _char_start(content, limit // 2)
+            tail_start = _char_start(content, size - limit // 2)
+            head = str(content[:head_end], "utf-8", "replace")
+            tail = str(content[tail_start:], "utf-8", "replace")
+        
+        return head + _ELISION_MARKER.format(tail_start - head_end) + tail
+    
+    @staticmethod
+    def _read_chunks(file_path: str) -> List[str]:
+        """
+        Read the content of a source file in parts of at most MAX_PROMPT_BYTES
+        
+        Parts end on character boundaries, unless a part would otherwise be empty.
+        
+        Args:
+            file_path: Path to the file
+            
+        Returns:
+            Consecutive parts of the file content (a single empty part for an empty file)
+        """
+        limit = config.get_config().MAX_PROMPT_BYTES
+        chunks = []
+        with _map_file(file_path) as content:
+            size = len(content)
+            step = limit or size
+            start = 0
+            while start < size:
+                end = start + step
+                if end < size:
+                    end = _char_start(content, end)
+                    if end <= start:
+                        end = start + step
+                chunks.append(str(content[start:end], "utf-8", "replace"))
+                start = end
+        return chunks or [""]
+    
     def _get_files_to_scan(self, directory_path: str, recursive: bool) -> Generator[str, None, None]:
         """
         Get all files to scan in the directory
@@ -143,18 +563,83 @@ class FileScanner:
         Yields:
             Paths of files to scan
         """
-        for root, dirs, files in os.walk(directory_path):
-            if not recursive and root != directory_path:
-                continue
-                
-            for file in files:
-                file_path = os.path.join(root, file)
-                _, ext = os.path.splitext(file_path)
+        for file_paths in self._get_file_batches_to_scan(directory_path, recursive):
+            yield from file_paths
+    
+    def _get_file_batches_to_scan(self, directory_path: str, recursive: bool) -> Generator[List[str], None, None]:
+        """
+        Find the files to scan in the directory, listing subdirectories in parallel
+        
+        Files are yielded as soon as they are found, so scanning can start before
+        the whole tree has been listed.
+        
+        Args:
+            directory_path: Path to the directory
+            recursive: Whether to scan subdirectories recursively
+            
+        Yields:
+            Batches of paths of files to scan (all files found since the previous batch)
+        """
+        cfg = config.get_config()
+        use_getdents = cfg.FAST_WALK
+        max_size = cfg.MAX_FILE_SIZE
+        extensions = cfg.SUPPORTED_EXTENSIONS
+        
+        found = queue.Queue(maxsize=WALK_QUEUE_SIZE)
+        stopped = threading.Event()
+        pending_lock = threading.Lock()
+        pending = 1  # Directories submitted but not yet listed
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=WALK_WORKERS,
+                                                         thread_name_prefix="CodeSheriff-walk")
+        
+        def put(item: Any) -> None:
+            # Wait for room in the queue, unless the consumer has gone away
+            while not stopped.is_set():
+                try:
+                    found.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+        
+        def walk(path: str) -> None:
+            nonlocal pending
+            try:
+                file_paths, subdirectories = list_directory(path, max_size, extensions, use_getdents)
+                for file_path in file_paths:
+                    put(file_path)
+                if recursive:
+                    for subdirectory in subdirectories:
+                        with pending_lock:
+                            pending += 1
+                        executor.submit(walk, subdirectory)
+            finally:
+                with pending_lock:
+                    pending -= 1
+                    done = pending == 0
+                if done:
+                    put(_WALK_DONE)
+        
+        executor.submit(walk, directory_path)
+        try:
+            while True:
+                # Wait for the next file, then take whatever else is already waiting
+                batch = [found.get()]
+                try:
+                    while len(batch) < WALK_QUEUE_SIZE:
+                        batch.append(found.get_nowait())
+                except queue.Empty:
+                    pass
                 
-                # Skip files that are too large or have unsupported extensions
-                if (ext in config.SUPPORTED_EXTENSIONS and 
-                    os.path.getsize(file_path) <= config.MAX_FILE_SIZE):
-                    yield file_path
+                done = batch[-1] is _WALK_DONE
+                if done:
+                    batch.pop()
+                if batch:
+                    yield batch
+                if done:
+                    return
+        finally:
+            stopped.set()
+            executor.shutdown(wait=False)
     
     def _aggregate_results(self, results: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
@@ -171,33 +656,42 @@ class FileScanner:
         clean_files = []
         error_files = []
         
+        # Bind loop invariants to locals once
+        suspicious_threshold = config.get_config().MALICIOUS_THRESHOLD / 2
+        add_malicious = malicious_files.append
+        add_suspicious = suspicious_files.append
+        add_clean = clean_files.append
+        add_error = error_files.append
+        
         for result in results:
             file_path = result.get("file_path", "unknown")
             
             if "error" in result:
-                error_files.append({
+                add_error({
                     "file_path": file_path,
                     "error": result["error"]
                 })
                 continue
             
-            analysis = result.get("analysis", {})
+            # Analyses always carry these keys (validated when the LLM response is parsed)
+            analysis = result["analysis"]
+            probability = analysis["malicious_probability"]
             
-            if analysis.get("is_malicious", False):
-                malicious_files.append({
+            if analysis["is_malicious"]:
+                add_malicious({
                     "file_path": file_path,
-                    "probability": analysis.get("malicious_probability", 1.0),
-                    "reasoning": analysis.get("reasoning", ""),
+                    "probability": probability,
+                    "reasoning": analysis["reasoning"],
                     "threats": analysis.get("identified_threats", [])
                 })
-            elif analysis.get("malicious_probability", 0) >= config.MALICIOUS_THRESHOLD / 2:
-                suspicious_files.append({
+            elif probability >= suspicious_threshold:
+                add_suspicious({
                     "file_path": file_path,
-                    "probability": analysis.get("malicious_probability", 0.0),
-                    "reasoning": analysis.get("reasoning", "")
+                    "probability": probability,
+                    "reasoning": analysis["reasoning"]
                 })
             else:
-                clean_files.append({
+                add_clean({
                     "file_path": file_path
                 })
         
@@ -209,8 +703,27 @@ class FileScanner:
                 "clean_files": len(clean_files),
                 "error_files": len(error_files)
             },
-            "malicious_files": sorted(malicious_files, key=lambda x: x["probability"], reverse=True),
-            "suspicious_files": sorted(suspicious_files, key=lambda x: x["probability"], reverse=True),
+            "malicious_files": self._rank_files(malicious_files),
+            "suspicious_files": self._rank_files(suspicious_files),
             "clean_files": clean_files,
             "error_files": error_files
-        } 
\ No newline at end of file
+        }
+    
+    @staticmethod
+    def _rank_files(files: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Order files by decreasing malicious probability
+        
+        Only the REPORT_TOP_K most probable files are kept if it is set, which
+        avoids sorting every file of a large scan.
+        
+        Args:
+            files: Files with a "probability" entry
+            
+        Returns:
+            The ranked files
+        """
+        top_k = config.get_config().REPORT_TOP_K
+        if top_k > 0:
+            return heapq.nlargest(top_k, files, key=lambda x: x["probability"])
+        return sorted(files, key=lambda x: x["probability"], reverse=True) 
\ No newline at end of file
@@ -1,19 +1,145 @@
 import json
 import os
-import threading
+import time
+import asyncio
 import logging
-from typing import Dict, Any, Optional, List
+import threading
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from types import ModuleType
+from typing import Dict, Any, Optional, List, Coroutine
 
-import litellm
-from litellm import completion
+import orjson
+from tenacity import AsyncRetrying, RetryCallState, retry_if_exception, stop_after_attempt, wait_exponential_jitter
 
 from utils import config
+from utils.hashing import content_hash
+from core.response_cache import ResponseCache
+from core.scheduler import FairScheduler
+from core.rate_limiter import TokenBucket
 
 # 设置日志记录
 logging.basicConfig(level=logging.WARNING, 
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("CodeSheriff")
 
+# Version of the analysis prompt; bump it whenever the prompt changes so cached results are not reused
+PROMPT_VERSION = "1"
+
+# Static parts of the malicious code detection prompt, around the file path and the code
+_PROMPT_INTRO = """You are a security expert analyzing code for malicious intent.
+        
+Please analyze the following code from file '"""
+
+_PROMPT_HEAD = """' and determine if it contains malicious code.
+Malicious code includes but is not limited to: backdoors, data exfiltration, encryption for ransomware,
+system manipulation without consent, obfuscated harmful functionality, etc.
+
+CODE TO ANALYZE:
+```
+"""
+
+_PROMPT_TAIL = """
+```
+
+Provide your analysis in the following JSON format:
+{
+    "is_malicious": true/false,
+    "malicious_probability": 0.0-1.0,
+    "reasoning": "detailed explanation of why the code is or isn't considered malicious",
+    "identified_threats": ["list", "of", "specific", "threats", "if", "any"]
+}
+
+Only respond with valid JSON. Do not include any other text in your response.
+"""
+
+# Providers whose Batch API is used through litellm
+BATCH_PROVIDERS = ("openai", "azure")
+
+# Batch statuses after which a batch will not make further progress
+_BATCH_FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+@lru_cache(maxsize=1)
+def _get_litellm() -> ModuleType:
+    """
+    Import and configure litellm on first use
+    
+    litellm is slow to import, so it is only loaded once an API call is made.
+    
+    Returns:
+        The litellm module
+    """
+    import litellm
+    
+    # 配置LiteLLM
+    litellm.suppress_debug_info = True  # 抑制调试信息
+    if not litellm.set_verbose:
+        # 非调试模式下只显示LiteLLM的警告
+        logging.getLogger("LiteLLM").setLevel(logging.WARNING)
+    
+    return litellm
+
+def _is_retryable(exc: BaseException) -> bool:
+    """Whether an API error is transient: rate limiting (429) or a server error (5xx)"""
+    litellm = _get_litellm()
+    return isinstance(exc, (litellm.RateLimitError, litellm.ServiceUnavailableError, litellm.InternalServerError))
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    """
+    Get the delay requested by the Retry-After header of a failed API response
+    
+    Args:
+        exc: Exception raised by the API call
+        
+    Returns:
+        Seconds to wait, or None if the response has no usable Retry-After header
+    """
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    value = headers.get("retry-after") if headers is not None else None
+    if not value:
+        return None
+    
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    
+    # Retry-After may also be an HTTP date
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+# Event loop shared by all LLM requests of the process, running in a background thread
+_event_loop = None
+_event_loop_lock = threading.Lock()
+
+def _get_event_loop() -> asyncio.AbstractEventLoop:
+    """Get the shared event loop, starting it on first use"""
+    global _event_loop
+    with _event_loop_lock:
+        if _event_loop is None:
+            _event_loop = asyncio.new_event_loop()
+            threading.Thread(target=_event_loop.run_forever, name="CodeSheriff-loop", daemon=True).start()
+        return _event_loop
+
+def run_coroutine(coro: Coroutine[Any, Any, Any]) -> Any:
+    """
+    Run a coroutine on the shared event loop and wait for its result
+    
+    Keeping a single long-lived loop lets litellm reuse its pooled HTTP connections
+    (and their TLS sessions) across scans, instead of setting them up again for every
+    new loop. Can be called from any thread except the loop's own.
+    
+    Args:
+        coro: Coroutine to run
+        
+    Returns:
+        The coroutine's result
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _get_event_loop()).result()
+
 class LLMClient:
     """
     A client for interacting with various LLM APIs using litellm as the adapter.
@@ -26,7 +152,9 @@ class LLMClient:
                  api_url: Optional[str] = None, 
                  model: Optional[str] = None,
                  provider: Optional[str] = None,
-                 verbose: bool = False):
+                 verbose: bool = False,
+                 use_cache: bool = True,
+                 max_concurrent_requests: Optional[int] = None):
         """
         Initialize the LLM client
         
@@ -36,23 +164,33 @@ class LLMClient:
             model: Model name (defaults to config)
             provider: Provider name (defaults to config)
             verbose: Whether to print verbose output
+            use_cache: Whether to reuse cached results for previously analyzed code
+            max_concurrent_requests: Maximum number of concurrent API requests (defaults to config)
         """
-        self.api_key = api_key or config.LLM_API_KEY
-        self.api_url = api_url or config.LLM_API_URL
-        self.model = model or config.LLM_MODEL
-        self.provider = provider or config.LLM_PROVIDER
+        cfg = config.get_config()
+        self.api_key = api_key or cfg.LLM_API_KEY
+        self.api_url = api_url or cfg.LLM_API_URL
+        self.model = model or cfg.LLM_MODEL
+        self.provider = provider or cfg.LLM_PROVIDER
+        self.max_concurrent_requests = max_concurrent_requests or cfg.MAX_CONCURRENT_REQUESTS
+        self.request_timeout = cfg.LLM_REQUEST_TIMEOUT
+        self.max_retries = cfg.LLM_MAX_RETRIES
+        self.retry_max_wait = cfg.LLM_RETRY_MAX_WAIT
         self.verbose = verbose
         
-        # 配置LiteLLM
-        litellm.set_verbose = False  # 关闭LiteLLM的详细输出
-        litellm.suppress_debug_info = True  # 抑制调试信息
+        # Limits concurrent API requests, sharing them fairly between concurrent scans
+        self.scheduler = FairScheduler(self.max_concurrent_requests)
         
-        # Semaphore to limit concurrent API requests
-        self.request_semaphore = threading.Semaphore(config.MAX_CONCURRENT_REQUESTS)
+        # Limits the rate of API requests, backing off when the provider rate limits them
+        self.rate_limiter = None
+        if cfg.LLM_REQUESTS_PER_SECOND > 0 or cfg.LLM_TOKENS_PER_MINUTE > 0:
+            self.rate_limiter = TokenBucket(cfg.LLM_REQUESTS_PER_SECOND, cfg.LLM_TOKENS_PER_MINUTE)
         
         # Counter for active requests
         self.active_requests = 0
-        self.counter_lock = threading.Lock()
+        
+        # Cache of analysis results keyed by content hash
+        self.cache = ResponseCache(cfg.CACHE_DIR, cfg.CACHE_TTL) if use_cache and cfg.CACHE_DIR else None
         
         if not self.api_key and self.provider not in ['local', 'custom']:
             raise ValueError(f"API key is required for provider {self.provider}. Set LLM_API_KEY in .env file or pass it directly.")
@@ -62,101 +200,205 @@ class LLMClient:
             if self.api_url:
                 logger.info(f"Using custom API URL: {self.api_url}")
     
-    def analyze_code(self, code: str, file_path: str) -> Dict[str, Any]:
+    async def analyze_code(self, code: str, file_path: str, submitter: Optional[str] = None) -> Dict[str, Any]:
         """
         Analyze code to determine if it's malicious
         
         Args:
             code: The code content to analyze
             file_path: Path to the file (for context)
+            submitter: Identifier of the scan the file belongs to, used to share
+                API requests fairly between concurrent scans
             
         Returns:
             Dict with analysis results including malicious probability and reasoning
         """
-        # Prepare the prompt for malicious code detection
-        prompt = self._create_malicious_code_prompt(code, file_path)
+        # Reuse the result of a previous analysis of the same code
+        cached = self.get_cached_analysis(code)
+        if cached is not None:
+            if self.verbose:
+                logger.info(f"Using cached result for file: {os.path.basename(file_path)}")
+            return cached
         
-        # Call the LLM API
         try:
-            response = self._call_api(prompt, file_path)
-            # Parse the response
-            return self._parse_response(response)
+            return await self._analyze(code, file_path, submitter)
         except Exception as e:
             logger.error(f"Error analyzing file {file_path}: {str(e)}")
-            return {
-                "is_malicious": False,
-                "malicious_probability": 0.0,
-                "reasoning": f"Error analyzing code: {str(e)}",
-                "error": True
-            }
+            return self._error_analysis(f"Error analyzing code: {str(e)}")
+    
+    async def _analyze(self, code: str, file_path: str, submitter: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Analyze code with the LLM, raising if the API call fails
+        
+        Args:
+            code: The code content to analyze
+            file_path: Path to the file (for context)
+            submitter: Identifier of the scan the file belongs to
+            
+        Returns:
+            Dict with analysis results including malicious probability and reasoning
+        """
+        # Prepare the prompt for malicious code detection
+        prompt = self._create_malicious_code_prompt(code, file_path)
+        
+        # Call the LLM API
+        response = await self._call_api(prompt, file_path, submitter or "default")
+        # Parse the response
+        result = self._parse_response(response)
+        self.cache_analysis(code, result)
+        return result
+    
+    def get_cached_analysis(self, code: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the cached analysis results for code, if any
+        
+        Args:
+            code: The code content
+            
+        Returns:
+            Cached analysis results, or None if the code has not been analyzed before
+        """
+        if self.cache is None:
+            return None
+        return self.cache.get(self._cache_key(code))
+    
+    def cache_analysis(self, code: str, result: Dict[str, Any]) -> None:
+        """
+        Cache the analysis results for code; failed analyses are not cached
+        
+        Args:
+            code: The code content
+            result: Analysis results for the code
+        """
+        if self.cache is not None and not result.get("error"):
+            self.cache.set(self._cache_key(code), result)
+    
+    def _cache_key(self, code: str) -> str:
+        """Get the cache key for code analyzed with this client's model and prompt"""
+        return content_hash(self.model, PROMPT_VERSION, code)
+    
+    def submit_batch(self, prompts: Dict[str, str]) -> str:
+        """
+        Submit prompts to the provider's Batch API
+        
+        Batches are processed asynchronously by the provider (within 24 hours) at a
+        lower cost than individual requests.
+        
+        Args:
+            prompts: Mapping of custom ID to prompt
+            
+        Returns:
+            ID of the created batch
+        """
+        if self.provider not in BATCH_PROVIDERS:
+            raise ValueError(f"Batch mode is not supported for provider {self.provider}. Supported providers: {', '.join(BATCH_PROVIDERS)}")
+        
+        litellm = _get_litellm()
+        requests = b"\n".join(
+            orjson.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": self._completion_params(prompt)
+            })
+            for custom_id, prompt in prompts.items()
+        )
+        
+        batch_file = litellm.create_file(
+            file=("code_sheriff_batch.jsonl", requests),
+            purpose="batch",
+            custom_llm_provider=self.provider,
+            **self._auth_params()
+        )
+        batch = litellm.create_batch(
+            completion_window="24h",
+            endpoint="/v1/chat/completions",
+            input_file_id=batch_file.id,
+            custom_llm_provider=self.provider,
+            **self._auth_params()
+        )
+        
+        if self.verbose:
+            logger.info(f"Submitted batch {batch.id} with {len(prompts)} requests")
+        
+        return batch.id
+    
+    def wait_for_batch(self, batch_id: str, poll_interval: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Wait for a batch to finish and collect its analysis results
+        
+        Args:
+            batch_id: ID of the batch returned by submit_batch
+            poll_interval: Seconds between status checks (defaults to config)
+            
+        Returns:
+            Dict mapping custom ID to analysis results
+        """
+        litellm = _get_litellm()
+        poll_interval = poll_interval or config.get_config().BATCH_POLL_INTERVAL
+        
+        while True:
+            batch = litellm.retrieve_batch(batch_id=batch_id, custom_llm_provider=self.provider, **self._auth_params())
+            if batch.status in _BATCH_FINAL_STATUSES:
+                break
+            if self.verbose:
+                logger.info(f"Batch {batch_id} is {batch.status}, checking again in {poll_interval}s")
+            time.sleep(poll_interval)
+        
+        if batch.status != "completed" or not batch.output_file_id:
+            raise RuntimeError(f"Batch {batch_id} did not complete (status: {batch.status})")
+        
+        output = litellm.file_content(file_id=batch.output_file_id, custom_llm_provider=self.provider,
+                                      **self._auth_params())
+        
+        results = {}
+        for line in output.content.splitlines():
+            if not line.strip():
+                continue
+            record = orjson.loads(line)
+            response = record.get("response") or {}
+            if record.get("error") or response.get("status_code") != 200:
+                error = record.get("error") or response.get("body")
+                results[record["custom_id"]] = self._error_analysis(f"Error analyzing code: {error}")
+                continue
+            try:
+                content = response["body"]["choices"][0]["message"]["content"]
+                results[record["custom_id"]] = self._parse_content(content)
+            except Exception as e:
+                logger.error(f"Error parsing LLM response: {str(e)}")
+                results[record["custom_id"]] = self._error_analysis(f"Error parsing LLM response: {str(e)}")
+        
+        return results
     
     def _create_malicious_code_prompt(self, code: str, file_path: str) -> str:
         """Create a prompt for malicious code detection"""
-        return f"""You are a security expert analyzing code for malicious intent.
-        
-Please analyze the following code from file '{file_path}' and determine if it contains malicious code.
-Malicious code includes but is not limited to: backdoors, data exfiltration, encryption for ransomware,
-system manipulation without consent, obfuscated harmful functionality, etc.
-
-CODE TO ANALYZE:
-```
-{code}
-```
-
-Provide your analysis in the following JSON format:
-{{
-    "is_malicious": true/false,
-    "malicious_probability": 0.0-1.0,
-    "reasoning": "detailed explanation of why the code is or isn't considered malicious",
-    "identified_threats": ["list", "of", "specific", "threats", "if", "any"]
-}}
-
-Only respond with valid JSON. Do not include any other text in your response.
-"""
+        return f"{_PROMPT_INTRO}{file_path}{_PROMPT_HEAD}{code}{_PROMPT_TAIL}"
     
-    def _call_api(self, prompt: str, file_path: str) -> Dict[str, Any]:
+    async def _call_api(self, prompt: str, file_path: str, submitter: str) -> Dict[str, Any]:
         """Call the LLM API with the given prompt"""
-        # Use a semaphore to limit concurrent API requests
-        with self.request_semaphore:
+        # Wait for the scheduler to hand this submitter a request slot
+        async with self.scheduler.slot(submitter):
             # Update active requests counter
-            with self.counter_lock:
-                self.active_requests += 1
-                current_active = self.active_requests
+            self.active_requests += 1
             
             # Print debug info if verbose
             if self.verbose:
                 filename = os.path.basename(file_path)
-                print(f"[Thread {threading.current_thread().name}] Analyzing {filename} with {self.model} (Active requests: {current_active}/{config.MAX_CONCURRENT_REQUESTS})")
+                print(f"Analyzing {filename} with {self.model} (Active requests: {self.active_requests}/{self.max_concurrent_requests})")
             
             try:
-                # Prepare the messages
-                messages = [{"role": "user", "content": prompt}]
-                
-                # 构建模型名称
-                if self.provider in ['custom', 'local']:
-                    model_name = self.model
-                else:
-                    model_name = self.model  # 直接使用模型名称，不要加上提供商前缀
-                
-                # 准备API调用参数
-                params = {
-                    "model": model_name,
-                    "messages": messages,
-                    "temperature": 0.1,
-                    "response_format": {"type": "json_object"}
-                }
-                
-                # 添加API URL和密钥（如果有）
-                if self.api_url:
-                    params["api_base"] = self.api_url
-                if self.api_key:
-                    params["api_key"] = self.api_key
+                # 准备API调用参数，添加API URL和密钥（如果有）
+                params = self._completion_params(prompt)
+                params.update(self._auth_params())
+                params["timeout"] = self.request_timeout
                 
                 if self.verbose:
-                    logger.info(f"Calling {model_name} API for file: {os.path.basename(file_path)}")
+                    logger.info(f"Calling {self.model} API for file: {os.path.basename(file_path)}")
                 
-                # 调用API
-                response = completion(**params)
+                # 调用API，限流或服务端错误时退避重试
+                async for attempt in self._retrying(file_path):
+                    with attempt:
+                        response = await self._rate_limited_completion(params, len(prompt) // 4)
                 
                 if self.verbose:
                     logger.info(f"Received response for file: {os.path.basename(file_path)}")
@@ -167,29 +409,278 @@ Only respond with valid JSON. Do not include any other text in your response.
                 raise
             finally:
                 # Update active requests counter
-                with self.counter_lock:
-                    self.active_requests -= 1
+                self.active_requests -= 1
+    
+    async def _rate_limited_completion(self, params: Dict[str, Any], tokens: int) -> Any:
+        """
+        Send one completion request once the rate limiter allows it
+        
+        Args:
+            params: Parameters of the completion request
+            tokens: Estimated number of prompt tokens of the request
+            
+        Returns:
+            The completion response
+        """
+        litellm = _get_litellm()
+        if self.rate_limiter is None:
+            return await litellm.acompletion(**params)
+        
+        await self.rate_limiter.acquire(tokens)
+        try:
+            response = await litellm.acompletion(**params)
+        except litellm.RateLimitError:
+            self.rate_limiter.on_rate_limited()
+            raise
+        self.rate_limiter.on_success()
+        return response
+    
+    def _retrying(self, file_path: str) -> AsyncRetrying:
+        """
+        Create the retry policy for one API request
+        
+        Rate-limited and failed (5xx) requests are retried with exponential
+        backoff and jitter, waiting at least as long as the Retry-After header asks.
+        
+        Args:
+            file_path: Path of the file being analyzed, for logging
+            
+        Returns:
+            Retrying controller to iterate over the attempts of the request
+        """
+        backoff = wait_exponential_jitter(initial=1, max=self.retry_max_wait)
+        
+        def wait(retry_state: RetryCallState) -> float:
+            delay = backoff(retry_state)
+            retry_after = _retry_after(retry_state.outcome.exception())
+            if retry_after is not None:
+                delay = max(delay, min(retry_after, self.retry_max_wait))
+            return delay
+        
+        def before_sleep(retry_state: RetryCallState) -> None:
+            logger.warning(f"Retrying {os.path.basename(file_path)} in {retry_state.next_action.sleep:.1f}s "
+                           f"after error: {retry_state.outcome.exception()}")
+        
+        return AsyncRetrying(
+            retry=retry_if_exception(_is_retryable),
+            stop=stop_after_attempt(self.max_retries + 1),
+            wait=wait,
+            before_sleep=before_sleep,
+            reraise=True,
+        )
+    
+    def _completion_params(self, prompt: str) -> Dict[str, Any]:
+        """Build the chat completion parameters for a prompt"""
+        # 直接使用模型名称，不要加上提供商前缀
+        return {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": 0.1,
+            "response_format": {"type": "json_object"}
+        }
+    
+    def _auth_params(self) -> Dict[str, str]:
+        """Get the API URL and key parameters, if set"""
+        params = {}
+        if self.api_url:
+            params["api_base"] = self.api_url
+        if self.api_key:
+            params["api_key"] = self.api_key
+        return params
     
     def _parse_response(self, response: Dict[str, Any]) -> Dict[str, Any]:
         """Parse the API response to extract the analysis results"""
         try:
             # Extract content from the response
-            content = response.choices[0].message.content
-            
-            # Parse the JSON content
-            result = json.loads(content)
-            
-            # Ensure the result has the expected format
-            if not all(key in result for key in ["is_malicious", "malicious_probability", "reasoning"]):
-                raise ValueError("Invalid response format")
-            
-            return result
+            return self._parse_content(response.choices[0].message.content)
         except (json.JSONDecodeError, KeyError, IndexError, AttributeError) as e:
             # Return an error response if parsing fails
             logger.error(f"Error parsing LLM response: {str(e)}")
-            return {
-                "is_malicious": False,
-                "malicious_probability": 0.0,
-                "reasoning": f"Error parsing LLM response: {str(e)}",
-                "error": True
-            } 
\ No newline at end of file
+            return self._error_analysis(f"Error parsing LLM response: {str(e)}")
+    
+    def _parse_content(self, content: str) -> Dict[str, Any]:
+        """Parse the JSON content of an LLM reply into analysis results"""
+        result = orjson.loads(content)
+        
+        # Ensure the result has the expected format
+        if not all(key in result for key in ["is_malicious", "malicious_probability", "reasoning"]):
+            raise ValueError("Invalid response format")
+        
+        return result
+    
+    @staticmethod
+    def _error_analysis(reasoning: str) -> Dict[str, Any]:
+        """Build the analysis results reported when a file could not be analyzed"""
+        return {
+            "is_malicious": False,
+            "malicious_probability": 0.0,
+            "reasoning": reasoning,
+            "error": True
+        } 
+
+class LLMClientPool:
+    """
+    Spreads requests over several LLM endpoints, each served by its own LLMClient.
+    
+    Every request goes to the least loaded healthy endpoint, relative to its
+    concurrency limit. An endpoint whose request fails is marked unhealthy for a
+    while and the request is retried on the next endpoint, so one failing
+    endpoint does not fail the scan.
+    
+    The pool can be used wherever an LLMClient is expected; cache lookups and
+    Batch API requests go to the first endpoint.
+    """
+    
+    # Seconds an endpoint is avoided after a failed request
+    UNHEALTHY_COOLDOWN = 30.0
+    
+    def __init__(self, clients: List[LLMClient]):
+        """
+        Initialize the pool
+        
+        Args:
+            clients: Clients of the endpoints, the first one being the primary endpoint
+        """
+        if not clients:
+            raise ValueError("At least one LLM endpoint is required")
+        self.clients = clients
+        self.model = clients[0].model
+        self.provider = clients[0].provider
+        self.verbose = clients[0].verbose
+        # Time until which each client is considered unhealthy
+        self._unhealthy_until = [0.0] * len(clients)
+        # Requests sent to each client and not yet answered, including those waiting for a slot
+        self._pending = [0] * len(clients)
+    
+    @classmethod
+    def from_endpoints(cls, endpoints: List[Dict[str, Any]], **client_args: Any) -> "LLMClientPool":
+        """
+        Create a pool from endpoint descriptions such as the LLM_ENDPOINTS setting
+        
+        Args:
+            endpoints: Endpoints, each a dict with optional "url", "key", "model",
+                "provider" and "concurrency_limit" entries
+            client_args: LLMClient arguments shared by all endpoints, used where
+                an endpoint does not set its own value
+            
+        Returns:
+            Pool over the endpoints
+            
+        Raises:
+            ValueError: If the endpoints are not a non-empty list of objects, or an
+                endpoint's client cannot be created (e.g. it has no API key)
+        """
+        if not isinstance(endpoints, list) or not all(isinstance(endpoint, dict) for endpoint in endpoints):
+            raise ValueError("LLM endpoints must be a list of objects")
+        
+        clients = []
+        for endpoint in endpoints:
+            limit = endpoint.get("concurrency_limit")
+            if limit is not None and (not isinstance(limit, int) or isinstance(limit, bool) or limit < 1):
+                raise ValueError(f"concurrency_limit must be a positive integer, got {limit!r}")
+            args = dict(client_args)
+            for key, arg in (("url", "api_url"), ("key", "api_key"), ("model", "model"),
+                             ("provider", "provider"), ("concurrency_limit", "max_concurrent_requests")):
+                if endpoint.get(key) is not None:
+                    args[arg] = endpoint[key]
+            clients.append(LLMClient(**args))
+        return cls(clients)
+    
+    @property
+    def active_requests(self) -> int:
+        """Number of requests in flight over all endpoints"""
+        return sum(client.active_requests for client in self.clients)
+    
+    @property
+    def max_concurrent_requests(self) -> int:
+        """Maximum number of concurrent requests over all endpoints"""
+        return sum(client.max_concurrent_requests for client in self.clients)
+    
+    async def analyze_code(self, code: str, file_path: str, submitter: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Analyze code on the least loaded healthy endpoint, failing over to the others on errors
+        
+        Args:
+            code: The code content to analyze
+            file_path: Path to the file (for context)
+            submitter: Identifier of the scan the file belongs to
+            
+        Returns:
+            Dict with analysis results including malicious probability and reasoning
+        """
+        cached = self.get_cached_analysis(code)
+        if cached is not None:
+            return cached
+        
+        remaining = list(range(len(self.clients)))
+        error = None
+        while remaining:
+            index = self._pick(remaining)
+            remaining.remove(index)
+            client = self.clients[index]
+            self._pending[index] += 1
+            try:
+                return await client._analyze(code, file_path, submitter)
+            except Exception as e:
+                error = e
+                self._unhealthy_until[index] = time.monotonic() + self.UNHEALTHY_COOLDOWN
+                if remaining:
+                    logger.warning(f"Endpoint {client.api_url or client.provider} failed for {os.path.basename(file_path)}, "
+                                   f"trying another endpoint: {str(e)}")
+            finally:
+                self._pending[index] -= 1
+        
+        logger.error(f"Error analyzing file {file_path}: {str(error)}")
+        return self._error_analysis(f"Error analyzing code: {str(error)}")
+    
+    def _pick(self, candidates: List[int]) -> int:
+        """
+        Pick the candidate client with the lowest load, preferring healthy ones
+        
+        The load counts requests still waiting for a slot of the client as well as
+        those in flight, so requests keep being spread once every client is busy.
+        """
+        now = time.monotonic()
+        
+        def load(index: int) -> Any:
+            return (self._unhealthy_until[index] > now,
+                    self._pending[index] / self.clients[index].max_concurrent_requests)
+        
+        return min(candidates, key=load)
+    
+    def get_cached_analysis(self, code: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the cached analysis results for code from any endpoint's model
+        
+        Args:
+            code: The code content
+            
+        Returns:
+            Cached analysis results, or None if the code has not been analyzed before
+        """
+        for client in self.clients:
+            cached = client.get_cached_analysis(code)
+            if cached is not None:
+                return cached
+        return None
+    
+    def cache_analysis(self, code: str, result: Dict[str, Any]) -> None:
+        """Cache the analysis results for code under the primary endpoint's model"""
+        self.clients[0].cache_analysis(code, result)
+    
+    def submit_batch(self, prompts: Dict[str, str]) -> str:
+        """Submit prompts to the Batch API of the primary endpoint"""
+        return self.clients[0].submit_batch(prompts)
+    
+    def wait_for_batch(self, batch_id: str, poll_interval: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """Wait for a batch of the primary endpoint to finish and collect its results"""
+        return self.clients[0].wait_for_batch(batch_id, poll_interval)
+    
+    def _create_malicious_code_prompt(self, code: str, file_path: str) -> str:
+        """Create the analysis prompt, as used by the primary endpoint"""
+        return self.clients[0]._create_malicious_code_prompt(code, file_path)
+    
+    @staticmethod
+    def _error_analysis(reasoning: str) -> Dict[str, Any]:
+        """Build the analysis results reported when a file could not be analyzed"""
+        return LLMClient._error_analysis(reasoning)
@@ -0,0 +1,199 @@
+import io
+import os
+import sys
+import keyword
+import logging
+import tokenize
+from typing import Dict, Any, Optional, FrozenSet
+
+from utils import config
+from utils.hashing import content_hash
+
+logger = logging.getLogger("CodeSheriff")
+
+# Names whose presence in Python code sends a file to the LLM: dynamic code execution and
+# attribute access, deserialization, decoding of embedded payloads, process control,
+# file system changes and network access
+SUSPICIOUS_NAMES = frozenset({
+    "exec", "eval", "compile", "__import__", "importlib", "builtins", "__builtins__", "__dict__", "modules",
+    "getattr", "setattr", "delattr", "globals", "locals", "vars",
+    "marshal", "pickle", "dill", "shelve",
+    "base64", "b64decode", "b32decode", "b16decode", "a85decode", "b85decode", "codecs", "zlib", "lzma", "bz2",
+    "subprocess", "Popen", "system", "popen", "pty", "fork", "forkpty", "kill", "posix_spawn", "posix_spawnp",
+    "execl", "execle", "execlp", "execlpe", "execv", "execve", "execvp", "execvpe",
+    "spawnl", "spawnle", "spawnlp", "spawnlpe", "spawnv", "spawnve", "spawnvp", "spawnvpe",
+    "ctypes", "cffi", "open", "remove", "unlink", "rename", "replace", "rmdir", "rmtree", "shutil", "chmod",
+    "socket", "urllib", "urlopen", "requests", "httpx", "aiohttp", "http", "ftplib", "smtplib", "telnetlib", "paramiko",
+    "environ", "getenv", "Fernet", "AES",
+})
+
+# Dunder names that only hold metadata; any other dunder name (e.g. __path__, __spec__ or
+# __name__) may change how the module or its relative imports are resolved
+_METADATA_DUNDERS = frozenset({
+    "__all__", "__doc__", "__version__", "__author__", "__email__", "__license__", "__copyright__",
+})
+
+# Python keywords that may be followed by an opening parenthesis without it being a call
+_KEYWORDS = frozenset(keyword.kwlist)
+
+# Tokens that carry no code
+_IGNORED_TOKENS = frozenset({tokenize.ENCODING, tokenize.NL, tokenize.NEWLINE, tokenize.COMMENT,
+                             tokenize.INDENT, tokenize.DEDENT, tokenize.ENDMARKER})
+
+# String literals longer than this may hide an encoded payload
+_MAX_STRING_LENGTH = 1024
+
+class Prefilter:
+    """
+    Classifies trivially clean files without calling the LLM.
+    
+    A file is clean if its content hash is in a list of known-good files, or if it
+    is Python code that cannot do anything by itself: no calls, decorators or
+    absolute imports (relative imports are allowed, as the imported modules are
+    scanned on their own), no dunder names other than metadata such as __all__
+    (which could redirect relative imports), none of SUSPICIOUS_NAMES and no very
+    long string literals. That covers e.g. package __init__ files and constant modules.
+    Every other file is left for the LLM.
+    """
+    
+    def __init__(self, known_hashes_path: Optional[str] = None):
+        """
+        Initialize the prefilter
+        
+        Args:
+            known_hashes_path: File listing content hashes of known-good files, one per
+                line (defaults to config; see `python -m core.prefilter`)
+        """
+        if known_hashes_path is None:
+            known_hashes_path = config.get_config().KNOWN_GOOD_HASHES
+        self.known_hashes = self._load_hashes(known_hashes_path) if known_hashes_path else frozenset()
+    
+    def check_file(self, file_path: str) -> Optional[Dict[str, Any]]:
+        """
+        Check a file on disk
+        
+        Args:
+            file_path: Path to the file
+        
+        Returns:
+            Clean analysis results, or None if the file has to be analyzed by the LLM
+        """
+        with open(file_path, "rb") as f:
+            return self.check(file_path, f.read())
+    
+    def check(self, file_path: str, content: bytes) -> Optional[Dict[str, Any]]:
+        """
+        Check the content of a file
+        
+        Args:
+            file_path: Path to the file, used to tell Python files from others
+            content: Content of the file
+        
+        Returns:
+            Clean analysis results, or None if the file has to be analyzed by the LLM
+        """
+        if self.known_hashes and content_hash(content) in self.known_hashes:
+            return self._clean_analysis("Prefilter: known-good file")
+        
+        if file_path.lower().endswith(".py") and not self._has_suspicious_tokens(content):
+            return self._clean_analysis("Prefilter: no calls, imports or suspicious names")
+        
+        return None
+    
+    @staticmethod
+    def _has_suspicious_tokens(content: bytes) -> bool:
+        """
+        Whether Python code may do anything when imported or run
+        
+        Args:
+            content: Python source code
+            
+        Returns:
+            True if the code calls anything, uses decorators, imports modules other
+            than relative ones, uses a suspicious name or a non-metadata dunder name,
+            or has a very long string literal
+        """
+        previous = previous2 = None
+        in_relative_import = False
+        try:
+            for token in tokenize.tokenize(io.BytesIO(content).readline):
+                kind, text = token.type, token.string
+                if kind in _IGNORED_TOKENS:
+                    if kind == tokenize.NEWLINE:
+                        in_relative_import = False
+                    continue
+                
+                if kind == tokenize.NAME:
+                    if text in SUSPICIOUS_NAMES:
+                        return True
+                    if text.startswith("__") and text.endswith("__") and text not in _METADATA_DUNDERS:
+                        return True
+                    if text == "import" and not in_relative_import:
+                        return True
+                elif kind == tokenize.STRING:
+                    # Before Python 3.12 an f-string is a single token, hiding the code in it
+                    prefix = text[:text.index(text[-1])].lower()
+                    if len(text) > _MAX_STRING_LENGTH or ("f" in prefix and "(" in text):
+                        return True
+                elif kind == tokenize.OP:
+                    if text == "@":
+                        return True
+                    if text == ";":
+                        in_relative_import = False
+                    if text == "(" and previous is not None:
+                        # A parenthesis after a name, a closing bracket or a string is a call,
+                        # except for the parameters of a function definition
+                        if previous.type == tokenize.NAME:
+                            if previous.string not in _KEYWORDS and not (
+                                    previous2 is not None and previous2.string == "def"):
+                                return True
+                        elif previous.type == tokenize.STRING or previous.string in (")", "]", "}"):
+                            return True
+                
+                # Only "from .module import ..." is allowed
+                if previous is not None and previous.type == tokenize.NAME and previous.string == "from":
+                    if text not in (".", "..."):
+                        return True
+                    in_relative_import = True
+                
+                previous2, previous = previous, token
+        except (tokenize.TokenError, SyntaxError, UnicodeDecodeError):
+            # Code that does not tokenize cleanly is left to the LLM
+            return True
+        return False
+    
+    @staticmethod
+    def _load_hashes(path: str) -> FrozenSet[str]:
+        """Load a list of content hashes, ignoring blank lines and comments"""
+        try:
+            with open(path, encoding="utf-8") as f:
+                return frozenset(line.strip() for line in f if line.strip() and not line.startswith("#"))
+        except OSError as e:
+            logger.warning(f"Error reading known-good hashes from {path}: {str(e)}")
+            return frozenset()
+    
+    @staticmethod
+    def _clean_analysis(reasoning: str) -> Dict[str, Any]:
+        """Build the analysis results of a file the prefilter found clean"""
+        return {
+            "is_malicious": False,
+            "malicious_probability": 0.0,
+            "reasoning": reasoning,
+            "identified_threats": []
+        }
+
+def main() -> None:
+    """Print the content hashes of the supported files under the given directories, e.g. site-packages"""
+    extensions = config.get_config().SUPPORTED_EXTENSIONS
+    for directory in sys.argv[1:]:
+        for root, _, files in os.walk(directory):
+            for name in files:
+                if os.path.splitext(name)[1].lower() in extensions:
+                    try:
+                        with open(os.path.join(root, name), "rb") as f:
+                            print(content_hash(f.read()))
+                    except OSError:
+                        continue
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import asyncio
+import time
+from typing import Optional
+
+# Fraction of the configured request rate regained after each successful request
+_RECOVERY_STEP = 0.02
+
+# Lowest request rate the limiter backs off to, as a fraction of the configured rate
+_MIN_RATE_FRACTION = 1 / 32
+
+# Seconds after a backoff during which further rate-limit errors do not lower the rate again
+_BACKOFF_COOLDOWN = 5.0
+
+class TokenBucket:
+    """
+    Limits the rate of LLM requests with two token buckets, one for requests
+    per second and one for prompt tokens per minute.
+    
+    The request rate adapts to the provider: it is halved when a request is
+    rate limited and slowly raised back to the configured rate as requests succeed.
+    """
+    
+    def __init__(self, rps: float = 0, tpm: float = 0):
+        """
+        Initialize the rate limiter
+        
+        Args:
+            rps: Maximum requests per second; 0 for no limit
+            tpm: Maximum prompt tokens per minute; 0 for no limit
+        """
+        self.max_rps = rps
+        self.rps = rps
+        self.tpm = tpm
+        
+        # Buckets start full so a scan can begin with a burst
+        self._requests = max(1.0, rps)
+        self._tokens = float(tpm)
+        self._updated = time.monotonic()
+        self._last_backoff = float("-inf")
+        # Created on first use, inside the event loop
+        self._lock: Optional[asyncio.Lock] = None
+    
+    async def acquire(self, tokens: int = 0) -> None:
+        """
+        Wait until a request with the given number of prompt tokens may be sent
+        
+        Args:
+            tokens: Estimated number of prompt tokens of the request
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        
+        # Requests are let through one at a time, in the order they arrived
+        async with self._lock:
+            while True:
+                wait = self._take(tokens)
+                if wait <= 0:
+                    return
+                await asyncio.sleep(wait)
+    
+    def on_rate_limited(self) -> None:
+        """Halve the request rate after the provider rejected a request with 429"""
+        now = time.monotonic()
+        if not self.max_rps or now - self._last_backoff < _BACKOFF_COOLDOWN:
+            return
+        
+        self._refill(now)
+        self._last_backoff = now
+        self.rps = max(self.rps / 2, self.max_rps * _MIN_RATE_FRACTION)
+        self._requests = min(self._requests, max(1.0, self.rps))
+    
+    def on_success(self) -> None:
+        """Raise the request rate back towards the configured rate after a successful request"""
+        if self.rps < self.max_rps:
+            self._refill(time.monotonic())
+            self.rps = min(self.max_rps, self.rps + self.max_rps * _RECOVERY_STEP)
+    
+    def _take(self, tokens: int) -> float:
+        """
+        Take a request and its tokens from the buckets if they have enough
+        
+        Args:
+            tokens: Estimated number of prompt tokens of the request
+        
+        Returns:
+            0 if the request may be sent, otherwise seconds to wait before trying again
+        """
+        self._refill(time.monotonic())
+        
+        # A request larger than the whole bucket only waits for a full bucket
+        tokens = min(tokens, self.tpm)
+        
+        wait = 0.0
+        if self.rps and self._requests < 1:
+            wait = (1 - self._requests) / self.rps
+        if self.tpm and self._tokens < tokens:
+            wait = max(wait, (tokens - self._tokens) * 60 / self.tpm)
+        if wait > 0:
+            return wait
+        
+        if self.rps:
+            self._requests -= 1
+        if self.tpm:
+            self._tokens -= tokens
+        return 0.0
+    
+    def _refill(self, now: float) -> None:
+        """Add the requests and tokens accrued since the last refill"""
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rps:
+            self._requests = min(max(1.0, self.rps), self._requests + elapsed * self.rps)
+        if self.tpm:
+            self._tokens = min(float(self.tpm), self._tokens + elapsed * self.tpm / 60)
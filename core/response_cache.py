@@ -0,0 +1,68 @@
+import logging
+from typing import Dict, Any, Optional
+
+import diskcache
+
+logger = logging.getLogger("CodeSheriff")
+
+class ResponseCache:
+    """
+    On-disk cache of LLM analysis results, keyed by a hash of the analyzed content.
+    Lets repeated scans (e.g. across CI runs) skip API calls for unchanged files.
+    """
+    
+    def __init__(self, directory: str, ttl: Optional[int] = None):
+        """
+        Initialize the response cache
+        
+        Args:
+            directory: Directory holding the cache database
+            ttl: Seconds before a cached result expires (None or 0 to keep results indefinitely)
+        """
+        self.directory = directory
+        self.ttl = ttl or None
+        try:
+            self._cache = diskcache.Cache(directory)
+        except Exception as e:
+            # E.g. a read-only home directory; scan without the cache instead of failing
+            logger.warning(f"Response cache disabled, cannot open {directory}: {str(e)}")
+            self._cache = None
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a cached analysis result
+        
+        Args:
+            key: Content hash of the analyzed code
+            
+        Returns:
+            The cached analysis result, or None if not cached
+        """
+        if self._cache is None:
+            return None
+        try:
+            return self._cache.get(key)
+        except Exception as e:
+            # A broken cache must never fail a scan
+            logger.warning(f"Error reading response cache: {str(e)}")
+            return None
+    
+    def set(self, key: str, result: Dict[str, Any]) -> None:
+        """
+        Store an analysis result
+        
+        Args:
+            key: Content hash of the analyzed code
+            result: Analysis result to cache
+        """
+        if self._cache is None:
+            return
+        try:
+            self._cache.set(key, result, expire=self.ttl)
+        except Exception as e:
+            logger.warning(f"Error writing response cache: {str(e)}")
+    
+    def close(self) -> None:
+        """Close the cache database"""
+        if self._cache is not None:
+            self._cache.close()
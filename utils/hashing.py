@@ -0,0 +1,21 @@
+import hashlib
+from typing import Union
+
+def content_hash(*parts: Union[str, bytes]) -> str:
+    """
+    Compute a hex digest identifying the given content
+    
+    Uses BLAKE2b from the standard library, which is fast on large inputs.
+    Parts are separated so that ("ab", "c") and ("a", "bc") hash differently.
+    
+    Args:
+        parts: Strings or bytes to hash, in order
+        
+    Returns:
+        Hex digest of the content
+    """
+    h = hashlib.blake2b(digest_size=32)
+    for part in parts:
+        h.update(part.encode("utf-8") if isinstance(part, str) else part)
+        h.update(b"\0")
+    return h.hexdigest()